@@ -18,9 +18,13 @@
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.shortcuts import render_to_response
-from django.core.urlresolvers import reverse
 from django.template.context import RequestContext
 from auditlog.models import AuditEntry
+from ganeti.utils import (
+    DataTablesQuery,
+    INSTANCE_DETAIL_URL,
+    USER_INFO_URL
+)
 import json
 
 
@@ -30,6 +34,17 @@ def auditlog(request):
                               context_instance=RequestContext(request))
 
 
+# DataTables columns of the audit log -> AuditEntry fields
+AUDITLOG_FIELDS = {
+    'job_id': 'job_id',
+    'cluster': 'cluster',
+    'instance': 'instance',
+    'action': 'action',
+    'user': 'requester__username',
+    'last_upd': 'last_updated',
+}
+
+
 @login_required
 def auditlog_json(request):
     if (
@@ -39,19 +54,22 @@ def auditlog_json(request):
         al = AuditEntry.objects.all()
     else:
         al = AuditEntry.objects.filter(requester=request.user)
+    datatables = DataTablesQuery.from_request(request)
+    if datatables is not None:
+        clusters = list(
+            al.order_by().values_list('cluster', flat=True).distinct()
+        )
+        total, displayed, al = datatables.filter_queryset(
+            al.select_related('requester'),
+            AUDITLOG_FIELDS
+        )
     entries = []
     for entry in al:
         entrydict = {}
         entrydict['user'] = entry.requester.username
         entrydict['user_id'] = entry.requester.id
         entrydict['user_href'] = "%s" % (
-            reverse(
-                "user-info",
-                kwargs={
-                    'type': 'user',
-                    'usergroup': entry.requester.username
-                }
-            )
+            USER_INFO_URL(type='user', usergroup=entry.requester.username)
         )
         entrydict['job_id'] = entry.job_id
         entrydict['instance'] = entry.instance
@@ -59,16 +77,18 @@ def auditlog_json(request):
         entrydict['action'] = entry.action
         entrydict['last_upd'] = "%s" % entry.last_updated
         entrydict['name_href'] = "%s" % (
-            reverse(
-                "instance-detail",
-                kwargs={
-                    'cluster_slug': entry.cluster,
-                    'instance': entry.instance
-                }
+            INSTANCE_DETAIL_URL(
+                cluster_slug=entry.cluster,
+                instance=entry.instance
             )
         )
         entries.append(entrydict)
     jresp = {}
     jresp['aaData'] = entries
+    if datatables is not None:
+        jresp['sEcho'] = datatables.echo
+        jresp['iTotalRecords'] = total
+        jresp['iTotalDisplayRecords'] = displayed
+        jresp['clusters'] = clusters
     res = jresp
     return HttpResponse(json.dumps(res), mimetype='application/json')
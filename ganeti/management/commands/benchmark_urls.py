@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*- vim:encoding=utf-8:
+# vim: tabstop=4:shiftwidth=4:softtabstop=4:expandtab
+
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from optparse import make_option
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+
+from ganeti.utils import (
+    INSTANCE_DETAIL_URL,
+    USER_INFO_URL,
+    GRAPH_URL,
+    NIC_GRAPH_URL
+)
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Compares the cost of reverse() to that of the URL templates' \
+        ' used by the JSON row builders'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '-n',
+            '--rows',
+            dest='rows',
+            type='int',
+            default=10000,
+            help='Number of URLs to build (default: 10000)'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        cases = [
+            (
+                'instance-detail',
+                lambda n: reverse(
+                    'instance-detail',
+                    kwargs={
+                        'cluster_slug': 'cluster',
+                        'instance': 'vm%d.example.com' % n
+                    }
+                ),
+                lambda n: INSTANCE_DETAIL_URL(
+                    cluster_slug='cluster',
+                    instance='vm%d.example.com' % n
+                ),
+            ),
+            (
+                'user-info',
+                lambda n: reverse(
+                    'user-info',
+                    kwargs={'type': 'user', 'usergroup': 'user%d' % n}
+                ),
+                lambda n: USER_INFO_URL(type='user', usergroup='user%d' % n),
+            ),
+            (
+                'graph',
+                lambda n: reverse(
+                    'graph',
+                    args=('cluster', 'vm%d.example.com' % n, 'cpu-ts')
+                ),
+                lambda n: GRAPH_URL(
+                    'cluster',
+                    'vm%d.example.com' % n,
+                    'cpu-ts'
+                ),
+            ),
+            (
+                'graph (nic)',
+                lambda n: reverse(
+                    'graph',
+                    args=(
+                        'cluster',
+                        'vm%d.example.com' % n,
+                        'net-ts',
+                        '/eth0'
+                    )
+                ),
+                lambda n: NIC_GRAPH_URL(
+                    'cluster',
+                    'vm%d.example.com' % n,
+                    'net-ts',
+                    '/eth0'
+                ),
+            ),
+        ]
+        for name, slow, fast in cases:
+            if slow(0) != fast(0):
+                self.stderr.write(
+                    "%s: %s != %s\n" % (name, slow(0), fast(0))
+                )
+                continue
+            start = default_timer()
+            for n in xrange(rows):
+                slow(n)
+            reverse_time = default_timer() - start
+            start = default_timer()
+            for n in xrange(rows):
+                fast(n)
+            template_time = default_timer() - start
+            self.stdout.write(
+                "%-16s reverse: %.3fs  template: %.3fs  speedup: %.1fx\n" % (
+                    name,
+                    reverse_time,
+                    template_time,
+                    reverse_time / max(template_time, 1e-9)
+                )
+            )
@@ -15,8 +15,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import re
+import copy
+import logging
 import random
 import sha
+import hashlib
 import ipaddr
 import base64
 import os
@@ -24,7 +27,7 @@ import os
 from datetime import datetime, timedelta
 from gevent.pool import Pool
 from socket import gethostbyname
-from time import sleep
+from time import mktime, sleep, time
 
 from django.db import models
 from django.http import Http404
@@ -38,11 +41,14 @@ from django.conf import settings
 
 from util import vapclient
 from util.client import GanetiRapiClient, GanetiApiError, GenericCurlConfig
+from util.client import JOB_STATUS_FINALIZED
 from ganetimgr.settings import GANETI_TAG_PREFIX
 
 from apply.models import Organization, InstanceApplication
 from apply.utils import get_os_details
 
+logger = logging.getLogger(__name__)
+
 REQUEST_ACTIONS = (
     (1, 'reinstall'),
     (2, 'destroy'),
@@ -53,6 +59,89 @@ REQUEST_ACTIONS = (
 RAPI_CONNECT_TIMEOUT = settings.RAPI_CONNECT_TIMEOUT
 RAPI_RESPONSE_TIMEOUT = settings.RAPI_RESPONSE_TIMEOUT
 
+# Default lifetimes (in seconds) of the per cluster inventory cache keys
+INSTANCES_CACHE_TIMEOUT = 45
+CLUSTER_CACHE_TIMEOUT = 180
+# How long an expired inventory key is still served, marked as stale, while
+# a single caller refreshes it
+STALE_CACHE_TIMEOUT = 600
+# Upper bound of a refresh; after that the refresh lock is considered dead
+REFRESH_LOCK_TIMEOUT = 2 * (RAPI_CONNECT_TIMEOUT + RAPI_RESPONSE_TIMEOUT)
+# How long the Instance objects built from a snapshot version are reused by
+# a process, if no newer version shows up
+INSTANCES_MEMO_TIMEOUT = 15
+# How long a Cluster object reuses the node index it read
+NODE_INDEX_MEMO_TIMEOUT = 10
+# How often the job feed of a cluster is synced with its job queue
+JOBS_CACHE_TIMEOUT = 5
+# How long finalized job records are kept; the feed fetches the expired ones
+# again, and the records of archived jobs do not linger forever
+FINALIZED_JOB_CACHE_TIMEOUT = 3600
+
+INSTANCE_FIELDS = [
+    'name',
+    'tags',
+    'pnode',
+    'disk.sizes',
+    'nic.modes',
+    'nic.ips',
+    'nic.links',
+    'status',
+    'admin_state',
+    'beparams',
+    'oper_state',
+    'hvparams',
+    'nic.macs',
+    'ctime',
+    'mtime',
+    'osparams',
+    'os',
+    'network_port'
+]
+
+# Cheap fields that tell whether a cached instance record is still current.
+# Runtime state is not covered by the instance mtime, so it is always fetched
+INSTANCE_STATE_FIELDS = [
+    'name',
+    'mtime',
+    'status',
+    'oper_state'
+]
+
+# Fields of the job records shown in the jobs page. Op results are left out,
+# they are only fetched for the details of a single job
+JOB_FIELDS = [
+    'id',
+    'status',
+    'ops',
+    'summary',
+    'received_ts',
+    'start_ts',
+    'end_ts'
+]
+
+NODE_FIELDS = [
+    'name',
+    'role',
+    'mfree',
+    'mtotal',
+    'dtotal',
+    'dfree',
+    'ctotal',
+    'group',
+    'pinst_cnt',
+    'offline',
+    'vm_capable',
+    'pinst_list'
+]
+
+# The snapshots that can answer a Cluster.query() for a kind of resource,
+# along with the fields they hold
+QUERY_SNAPSHOTS = {
+    'instance': ('instances', INSTANCE_FIELDS),
+    'node': ('nodes', NODE_FIELDS),
+}
+
 SHA1_RE = re.compile('^[a-f0-9]{40}$')
 
 try:
@@ -137,7 +226,27 @@ class InstanceManager(object):
                            if '%s:%s' % (arg, val) in result.tags]
         return results
 
+    def _get_by_name(self, name):
+        '''Looks the instance up in the cluster the instance name index points
+        to. Returns None if the index cannot tell'''
+        slug = cache.get(_instance_cluster_key(name))
+        if slug is None:
+            return None
+        try:
+            cluster = Cluster.objects.get(slug=slug)
+            return cluster.get_instance(name)
+        except (Cluster.DoesNotExist, Http404):
+            # The index outlived the instance or its cluster
+            cache.delete(_instance_cluster_key(name))
+            return None
+        except GanetiApiError:
+            return None
+
     def get(self, **kwargs):
+        if kwargs.keys() == ['name']:
+            instance = self._get_by_name(kwargs['name'])
+            if instance is not None:
+                return instance
         results = self.filter(**kwargs)
         if len(results) == 1:
             return results[0]
@@ -148,8 +257,35 @@ class InstanceManager(object):
 
 
 class Instance(object):
+    '''An instance of a cluster, backed by its RAPI record. The record's
+    fields are exposed as attributes (dots replaced by underscores), while
+    the attributes derived from it (owners, organization and flags from the
+    tags, links, IPv6 addresses, timestamps) are only computed on access'''
     objects = InstanceManager()
 
+    __slots__ = (
+        'cluster',
+        'name',
+        'listusers',
+        'listorganizations',
+        'listgroups',
+        'listinstanceapplications',
+        'networks',
+        'admin_view_only',
+        'joblock',
+        '_info',
+        '_tags',
+        '_nic_ips',
+        '_links',
+        '_ipv6s',
+        # Annotations set by the instance views
+        'cpu_url',
+        'net_url',
+        'netw',
+        'osname',
+        'node_group_locked',
+    )
+
     def __init__(
         self,
         cluster,
@@ -168,134 +304,150 @@ class Instance(object):
         self.listgroups = listgroups
         self.listinstanceapplications = listinstanceapplications
         self.networks = networks
-        self.organization = None
-        self.application = None
-        self.services = []
-        self.users = []
-        self.groups = []
-        self.links = []
-        self.ipv6s = []
         self.admin_view_only = False
-        self.adminlock = False
-        self.isolate = False
-        self.needsreboot = False
-        self.whitelistip = None
         self.joblock = False
+        self.cpu_url = None
+        self.net_url = None
+        self.netw = None
+        self.osname = None
+        self.node_group_locked = None
         self._update(info)
 
+    def __copy__(self):
+        # The RAPI record is shared, the annotations set afterwards
+        # are not
+        instance = Instance.__new__(Instance)
+        for attr in Instance.__slots__:
+            setattr(instance, attr, getattr(self, attr))
+        return instance
+
     def _update(self, info=None):
-        user_cache = {}
-        group_cache = {}
-        org_cache = {}
-        app_cache = {}
-        serv_cache = {}
         if not info:
             info = self.cluster.get_instance_info(self.name)
-        for attr in info:
-            self.__dict__[attr.replace(".", "_")] = info[attr]
-        for tag in self.tags:
-            group_pfx = "%s:group:" % GANETI_TAG_PREFIX
-            user_pfx = "%s:user:" % GANETI_TAG_PREFIX
-            org_pfx = "%s:org:" % GANETI_TAG_PREFIX
-            app_pfx = "%s:application:" % GANETI_TAG_PREFIX
-            serv_pfx = "%s:service:" % GANETI_TAG_PREFIX
-            adminlock_tag = "%s:adminlock" % GANETI_TAG_PREFIX
-            isolate_tag = "%s:isolate" % GANETI_TAG_PREFIX
-            needsreboot_tag = "%s:needsreboot" % GANETI_TAG_PREFIX
-            whitelist_pfx = "%s:whitelist_ip:" % GANETI_TAG_PREFIX
-            if tag.startswith(group_pfx):
-                group = tag.replace(group_pfx, '')
-                if group not in group_cache:
-                    try:
-                        g = self.listgroups[group]
-                    except:
-                        g = None
-                    group_cache[group] = g
-                if group_cache[group] is not None:
-                    self.groups.append(group_cache[group])
-            elif tag.startswith(user_pfx):
-                user = tag.replace(user_pfx, '')
-                if user not in user_cache:
-                    try:
-                        u = self.listusers[user]
-                    except:
-                        u = None
-                    user_cache[user] = u
-                if user_cache[user] is not None:
-                    self.users.append(user_cache[user])
-            elif tag.startswith(org_pfx):
-                org = tag.replace(org_pfx, '')
-                if org not in org_cache:
-                    try:
-                        o = self.listorganizations[org]
-                    except:
-                        o = None
-                    org_cache[org] = o
-                if org_cache[org] is not None:
-                    self.organization = org_cache[org]
-            elif tag.startswith(app_pfx):
-                app = tag.replace(app_pfx, '')
-                if app not in app_cache:
-                    try:
-                        a = self.listinstanceapplications[app]
-                    except:
-                        a = None
-                    app_cache[app] = a
-                if app_cache[app] is not None:
-                    self.application = app_cache[app]
-            elif tag.startswith(serv_pfx):
-                serv = tag.replace(serv_pfx, '')
-                if serv not in serv_cache:
-                    serv_cache[serv] = serv
-                if serv_cache[serv] is not None:
-                    self.services.append(serv_cache[serv])
-            elif tag == adminlock_tag:
-                self.adminlock = True
-            elif tag == isolate_tag:
-                self.isolate = True
-            elif tag == needsreboot_tag:
-                self.needsreboot = True
-            elif tag.startswith(whitelist_pfx):
-                self.whitelistip = tag.replace(whitelist_pfx, '')
-        if getattr(self, 'ctime', None):
-            self.ctime = datetime.fromtimestamp(self.ctime)
-        if getattr(self, 'mtime', None):
-            self.mtime = datetime.fromtimestamp(self.mtime)
-        for nlink in self.nic_links:
-            try:
-                self.links.append(self.networks[nlink])
-            except Exception:
-                pass
-        for i in range(len(self.nic_modes)):
-            if self.nic_modes[i] == 'bridged':
-                self.nic_ips[i] = None
-        for i in range(len(self.links)):
-            try:
-                ipv6addr = self.generate_ipv6(self.links[i], self.nic_macs[i])
-                if not ipv6addr:
-                    continue
-                self.ipv6s.append("%s" % (ipv6addr))
-            except Exception:
-                pass
-        if self.admin_state == 'up':
-            self.admin_state = True
-        if self.admin_state == 'down':
-            self.admin_state = False
+        self._info = info
+        self._tags = None
+        self._nic_ips = None
+        self._links = None
+        self._ipv6s = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes that are not slots, properties or
+        # annotations; look them up in the RAPI record
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        info = self._info
+        if attr in info:
+            return info[attr]
+        field = attr.replace('_', '.', 1)
+        if field in info:
+            return info[field]
+        field = attr.replace('_', '.')
+        if field in info:
+            return info[field]
+        raise AttributeError(attr)
+
+    def _parse_tags(self):
+        if self._tags is not None:
+            return self._tags
+        names = parse_instance_tags(self._info.get('tags', ()))
+        listusers = self.listusers or {}
+        listgroups = self.listgroups or {}
+        parsed = {
+            'users': [
+                listusers[user] for user in names['users']
+                if user in listusers
+            ],
+            'groups': [
+                listgroups[group] for group in names['groups']
+                if group in listgroups
+            ],
+            'organization': None,
+            'application': None,
+            'services': list(names['services']),
+            'adminlock': names['adminlock'],
+            'isolate': names['isolate'],
+            'needsreboot': names['needsreboot'],
+            'whitelistip': names['whitelistip'],
+        }
+        if names['organization'] is not None:
+            parsed['organization'] = (self.listorganizations or {}).get(
+                names['organization']
+            )
+        if names['application'] is not None:
+            parsed['application'] = (
+                self.listinstanceapplications or {}
+            ).get(names['application'])
+        self._tags = parsed
+        return parsed
+
+    users = property(lambda self: self._parse_tags()['users'])
+    groups = property(lambda self: self._parse_tags()['groups'])
+    organization = property(lambda self: self._parse_tags()['organization'])
+    application = property(lambda self: self._parse_tags()['application'])
+    services = property(lambda self: self._parse_tags()['services'])
+    adminlock = property(lambda self: self._parse_tags()['adminlock'])
+    isolate = property(lambda self: self._parse_tags()['isolate'])
+    needsreboot = property(lambda self: self._parse_tags()['needsreboot'])
+    whitelistip = property(lambda self: self._parse_tags()['whitelistip'])
+
+    @property
+    def admin_state(self):
+        state = self._info.get('admin_state')
+        if state == 'up':
+            return True
+        if state == 'down':
+            return False
+        return state
+
+    @property
+    def ctime(self):
+        ctime = self._info.get('ctime')
+        if ctime:
+            return datetime.fromtimestamp(ctime)
+        return ctime
+
+    @property
+    def mtime(self):
+        mtime = self._info.get('mtime')
+        if mtime:
+            return datetime.fromtimestamp(mtime)
+        return mtime
+
+    @property
+    def nic_ips(self):
+        if self._nic_ips is None:
+            # Bridged NICs do not get their addresses from the cluster
+            self._nic_ips = [
+                None if mode == 'bridged' else ip
+                for (ip, mode) in zip(
+                    self._info['nic.ips'],
+                    self._info['nic.modes']
+                )
+            ]
+        return self._nic_ips
+
+    @property
+    def links(self):
+        if self._links is None:
+            networks = self.networks or {}
+            self._links = [
+                networks[nlink] for nlink in self._info['nic.links']
+                if nlink in networks
+            ]
+        return self._links
+
+    @property
+    def ipv6s(self):
+        if self._ipv6s is None:
+            ipv6s = self._info.get('ipv6s')
+            if ipv6s is None:
+                # Not derived with the snapshot, e.g. a single instance query
+                ipv6s = nic_ipv6s(self._info, self.networks or {})
+            self._ipv6s = ipv6s
+        return self._ipv6s
 
     def generate_ipv6(self, prefix, mac):
-        try:
-            prefix = ipaddr.IPv6Network(prefix)
-            mac_parts = mac.split(":")
-            prefix_parts = prefix.network.exploded.split(':')
-            eui64 = mac_parts[:3] + ["ff", "fe"] + mac_parts[3:]
-            eui64[0] = "%02x" % (int(eui64[0], 16) ^ 0x02)
-            ip = ":".join(prefix_parts[:4])
-            for l in range(0, len(eui64), 2):
-                ip += ":%s" % "".join(eui64[l:l + 2])
-            ip = ipaddr.IPAddress(ip).compressed
-            return ip
-        except:
-            return False
+        return eui64_address(prefix, mac) or False
 
     def set_params(self, **kwargs):
         job_id = self.cluster._client.ModifyInstance(self.name, **kwargs)
@@ -375,6 +527,12 @@ class Cluster(models.Model):
         verbose_name="Disable Instance Creation",
         help_text="True disables setting a network at the application review form and blocks instance creation"
     )
+    compress_rapi = models.BooleanField(
+        default=False,
+        verbose_name="Compress RAPI responses",
+        help_text="Ask the cluster for compressed responses. Worth it for"
+        " clusters behind slow links"
+    )
 
     class Meta:
         permissions = (
@@ -383,6 +541,8 @@ class Cluster(models.Model):
 
     def __init__(self, *args, **kwargs):
         models.Model.__init__(self, *args, **kwargs)
+        self._stale = set()
+        self._node_index = None
         curl_conf = GenericCurlConfig(
             connect_timeout=RAPI_CONNECT_TIMEOUT,
             timeout=RAPI_RESPONSE_TIMEOUT
@@ -391,7 +551,8 @@ class Cluster(models.Model):
             host=self.hostname,
             username=self.username,
             password=self.password,
-            curl_config_fn=curl_conf
+            curl_config_fn=curl_conf,
+            compression=self.compress_rapi
         )
 
     def __unicode__(self):
@@ -467,33 +628,100 @@ class Cluster(models.Model):
             else:
                 raise
 
-    def get_instances(self):
-        retinstances = []
-        instances = cache.get("cluster:%s:instances" % self.slug)
-        if instances is None:
-            instances = parseQuery(
-                self._client.Query(
-                    'instance',
-                    [
-                        'name',
-                        'tags',
-                        'pnode',
-                        'disk.sizes',
-                        'nic.modes',
-                        'nic.ips',
-                        'nic.links',
-                        'status',
-                        'admin_state',
-                        'beparams',
-                        'oper_state',
-                        'hvparams',
-                        'nic.macs',
-                        'ctime',
-                        'mtime'
-                    ]))
-            cache.set("cluster:%s:instances" % self.slug, instances, 45)
+    def _cache_key(self, what):
+        return "cluster:%s:%s" % (self.slug, what)
+
+    def _store(self, what, value, timeout):
+        '''Caches value as cluster:<slug>:<what>. It is fresh for timeout
+        seconds and is kept as stale for STALE_CACHE_TIMEOUT more seconds'''
+        cache.set(
+            self._cache_key(what),
+            (time() + timeout, value),
+            timeout + STALE_CACHE_TIMEOUT
+        )
+
+    def _get_or_refresh(self, what, refresh):
+        '''Returns the cached cluster:<slug>:<what> value. When it has expired
+        only one caller runs refresh(), while the rest keep getting the
+        previous value, marked as stale, until the refresh is done'''
+        key = self._cache_key(what)
+        lock_key = "%s:refreshlock" % key
+        token = '%x' % random.getrandbits(64)
+        waited = 0
+        retried = False
+        while True:
+            entry = cache.get(key)
+            if entry is not None and entry[0] > time():
+                self._stale.discard(what)
+                return entry[1]
+            locked = cache.add(lock_key, token, REFRESH_LOCK_TIMEOUT)
+            if locked is None:
+                # The cache could not be reached, so there is no lock to
+                # take or anyone to wait for
+                value = refresh()
+                self._stale.discard(what)
+                return value
+            if locked:
+                try:
+                    value = refresh()
+                finally:
+                    _release_lock(lock_key, token)
+                self._stale.discard(what)
+                return value
+            if entry is not None:
+                self._stale.add(what)
+                return entry[1]
+            if not retried and cache.get(lock_key) is None:
+                # The holder has just released the lock; read its value
+                # again, or take the lock if its refresh failed
+                retried = True
+                continue
+            if waited >= REFRESH_LOCK_TIMEOUT:
+                raise GanetiApiError(
+                    "Timed out waiting for the refresh of %s" % key
+                )
+            # Nothing to serve yet, wait for the refresh to finish
+            sleep(0.2)
+            waited += 0.2
+
+    def is_stale(self, what=None):
+        '''Whether the last value returned by a cache getter (or any of
+        them, if what is None) was a stale one'''
+        if what is None:
+            return len(self._stale) > 0
+        return what in self._stale
+
+    def get_snapshot_version(self):
+        '''Returns the version of the cached instances snapshot, or None if
+        there is no snapshot in the cache'''
+        return cache.get(self._cache_key('version'))
+
+    def _publish_snapshot_version(self, instances, timeout):
+        '''Publishes the version of a new snapshot. It is kept if the data
+        did not change, so that what is cached per version stays valid'''
+        digest = hashlib.sha1(
+            json.dumps(instances, sort_keys=True, default=str)
+        ).hexdigest()
+        version = cache.get(self._cache_key('version'))
+        previous = cache.get(self._cache_key('digest'))
+        if (
+            version is None or
+            previous is None or
+            previous != (digest, version)
+        ):
+            version = int(time() * 1000)
+        cache.set_many(
+            {
+                self._cache_key('version'): version,
+                self._cache_key('digest'): (digest, version),
+            },
+            timeout + STALE_CACHE_TIMEOUT
+        )
+        return version
+
+    def _build_instances(self, instances):
         users, orgs, groups, instanceapps, networks = preload_instance_data()
-        retinstances = [
+        return [
             Instance(
                 self,
                 info['name'],
@@ -505,69 +733,280 @@ class Cluster(models.Model):
                 networks=networks
             ) for info in instances
         ]
-        return retinstances
+
+    def _fetch_instances(self, previous=None):
+        '''Fetches the instances of the cluster. Given the previous snapshot,
+        only the state fields of every instance are queried and full records
+        are fetched just for the instances that are new or whose mtime
+        changed'''
+        if not previous:
+            return list(self._client.QueryIter('instance', INSTANCE_FIELDS))
+        previous = dict([(info['name'], info) for info in previous])
+        states = list(
+            self._client.QueryIter('instance', INSTANCE_STATE_FIELDS)
+        )
+        changed = []
+        for state in states:
+            info = previous.get(state['name'])
+            if (
+                info is None or
+                info.get('mtime') != state['mtime'] or
+                not set(INSTANCE_FIELDS).issubset(info)
+            ):
+                changed.append(state['name'])
+        if len(changed) > len(states) / 2:
+            return list(self._client.QueryIter('instance', INSTANCE_FIELDS))
+        if changed:
+            for info in self._client.QueryIter(
+                'instance',
+                INSTANCE_FIELDS,
+                ["|"] + [["=", "name", name] for name in changed]
+            ):
+                previous[info['name']] = info
+        changed = set(changed)
+        instances = []
+        for state in states:
+            info = previous.get(state['name'])
+            # Could have been removed after the state query
+            if info is None:
+                continue
+            if state['name'] not in changed:
+                info.update(state)
+            instances.append(info)
+        return instances
+
+    def refresh_instances(self, timeout=None, incremental=True):
+        timeout = timeout or INSTANCES_CACHE_TIMEOUT
+        previous = None
+        if incremental:
+            entry = cache.get(self._cache_key('instances'))
+            if entry is not None:
+                previous = entry[1]
+        instances = self._fetch_instances(previous)
+        self._publish_snapshot(instances, timeout)
+        return instances
+
+    def _publish_snapshot(self, instances, timeout):
+        self._derive_ipv6s(instances)
+        self._store('instances', instances, timeout)
+        self._index_instances(instances, timeout)
+        self._store('visibility', self._build_visibility(instances), timeout)
+        self._update_accounting(instances, timeout)
+        self._store('stats', self._build_stats(instances), timeout)
+        self._publish_snapshot_version(instances, timeout)
+
+    def _derive_ipv6s(self, instances):
+        '''Stores in every instance record of the snapshot the IPv6
+        addresses of its NICs on the cluster's networks with a prefix'''
+        prefixes = dict(
+            self.network_set.exclude(ipv6_prefix=None).values_list(
+                'link',
+                'ipv6_prefix'
+            )
+        )
+        for info in instances:
+            info['ipv6s'] = nic_ipv6s(info, prefixes)
+
+    def _index_instances(self, instances, timeout):
+        '''Caches every instance record of the snapshot under its own key, so
+        that get_instance_info() is a single cache read, and points the
+        instance name index to this cluster'''
+        index = {}
+        for info in instances:
+            index[self._instance_cache_key(info['name'])] = info
+            index[_instance_cluster_key(info['name'])] = self.slug
+        cache.set_many(index, timeout)
+
+    def _build_visibility(self, instances):
+        '''Maps the ids of the users and groups tagged on the instances of the
+        snapshot to the names of the instances they can see'''
+        users = {}
+        groups = {}
+        for info in instances:
+            tags = parse_instance_tags(info.get('tags', ()))
+            for username in tags['users']:
+                users.setdefault(username, set()).add(info['name'])
+            for groupname in tags['groups']:
+                groups.setdefault(groupname, set()).add(info['name'])
+        visibility = {'users': {}, 'groups': {}}
+        if users:
+            for username, pk in User.objects.values_list('username', 'pk'):
+                if username in users:
+                    visibility['users'][pk] = users[username]
+        if groups:
+            for groupname, pk in Group.objects.values_list('name', 'pk'):
+                if groupname in groups:
+                    visibility['groups'][pk] = groups[groupname]
+        return visibility
+
+    def _update_accounting(self, instances, timeout):
+        '''Applies the changes of the snapshot to the resource accounting of
+        the cluster. Along with the totals per user it keeps what every
+        instance accounts for, so only the instances that changed since the
+        previous refresh are accounted again'''
+        entry = cache.get(self._cache_key('accounting'))
+        if entry is None:
+            accounting = {'instances': {}, 'users': {}}
+        else:
+            # Even a stale entry is a good base to apply changes to
+            accounting = entry[1]
+        accounted = accounting['instances']
+        users = accounting['users']
+        names = set()
+        for info in instances:
+            names.add(info['name'])
+            resources = _instance_resources(info)
+            previous = accounted.get(info['name'])
+            if previous == resources:
+                continue
+            if previous is not None:
+                _account_resources(users, previous, -1)
+            _account_resources(users, resources, 1)
+            accounted[info['name']] = resources
+        for name in [name for name in accounted if name not in names]:
+            _account_resources(users, accounted.pop(name), -1)
+        self._store('accounting', accounting, timeout)
+        return accounting
+
+    def refresh_accounting(self, timeout=None):
+        timeout = timeout or INSTANCES_CACHE_TIMEOUT
+        instances = self._get_or_refresh('instances', self.refresh_instances)
+        return self._update_accounting(instances, timeout)
+
+    def get_accounting(self):
+        '''Returns the resources (instances, cpu, memory and disk) of the
+        instances of the cluster per owner username'''
+        return self._get_or_refresh(
+            'accounting',
+            self.refresh_accounting
+        )['users']
+
+    def _build_stats(self, instances):
+        '''Counts the instances of the snapshot, the running and the stopped
+        ones, and builds the cumulative instance creation timeline'''
+        stats = {'instances': len(instances), 'up': 0, 'down': 0}
+        created = []
+        for info in instances:
+            if info.get('admin_state') in ['down', False, None]:
+                stats['down'] += 1
+            else:
+                stats['up'] += 1
+            if info.get('ctime'):
+                created.append((
+                    1000 * mktime(
+                        datetime.fromtimestamp(info['ctime']).timetuple()
+                    ),
+                    info['name']
+                ))
+        created.sort()
+        stats['timeline'] = [
+            {'time': ctime, 'name': name, 'count': count}
+            for (count, (ctime, name)) in enumerate(created, 1)
+        ]
+        return stats
+
+    def refresh_stats(self, timeout=None):
+        timeout = timeout or INSTANCES_CACHE_TIMEOUT
+        instances = self._get_or_refresh('instances', self.refresh_instances)
+        stats = self._build_stats(instances)
+        self._store('stats', stats, timeout)
+        return stats
+
+    def get_stats(self):
+        '''Returns the instance counters (instances, up, down) and the
+        creation timeline of the cluster'''
+        return self._get_or_refresh('stats', self.refresh_stats)
+
+    def _get_visible_instances(self, user):
+        '''Returns the instances the user can see, using the visibility index
+        and the instance records of the current snapshot, or None if they
+        are not cached'''
+        entry = cache.get(self._cache_key('visibility'))
+        if entry is None or entry[0] <= time():
+            return None
+        visibility = entry[1]
+        names = set(visibility['users'].get(user.pk, ()))
+        for pk in user.groups.values_list('pk', flat=True):
+            names.update(visibility['groups'].get(pk, ()))
+        if not names:
+            return []
+        keys = [self._instance_cache_key(name) for name in sorted(names)]
+        records = cache.get_many(keys)
+        if len(records) < len(keys):
+            return None
+        return self._build_instances([records[key] for key in keys])
+
+    def get_instances(self):
+        '''Returns the Instance objects of the cluster. They are built once
+        per snapshot version and kept by the process; each call gets its
+        own copies, so that the views can annotate them'''
+        version = self.get_snapshot_version()
+        memo = _instances_memo.get(self.slug)
+        if (
+            version is not None and
+            memo is not None and
+            memo[0] == version and
+            memo[1] > time()
+        ):
+            self._stale.discard('instances')
+            return [copy.copy(instance) for instance in memo[2]]
+        instances = self._build_instances(
+            self._get_or_refresh('instances', self.refresh_instances)
+        )
+        # The instances are at least as recent as the version read above
+        if version is not None and not self.is_stale('instances'):
+            _instances_memo[self.slug] = (
+                version,
+                time() + INSTANCES_MEMO_TIMEOUT,
+                instances
+            )
+        return [copy.copy(instance) for instance in instances]
 
     def force_cluster_cache_refresh(self, instance):
         '''Used in cases of actions that could potentially lock the cluster
         thus preventing users from listing, even for some seconds, their
         instances and delay node listing for admins
         '''
-        retinstances = []
-        instances = self._client.GetInstances(bulk=True)
+        instances = list(self._client.GetInstancesIter())
         for i in instances:
             if i['name'] == instance:
                 i['action_lock'] = True
-        cache.set("cluster:%s:instances" % self.slug, instances, 45)
-        users, orgs, groups, instanceapps, networks = preload_instance_data()
-        retinstances = [
-            Instance(
-                self,
-                info['name'],
-                info,
-                listusers=users,
-                listorganizations=orgs,
-                listgroups=groups,
-                listinstanceapplications=instanceapps,
-                networks=networks
-            ) for info in instances
-        ]
-        return retinstances
+        self._publish_snapshot(instances, INSTANCES_CACHE_TIMEOUT)
+        return self._build_instances(instances)
 
     def get_user_instances(self, user):
-        instances = self.get_instances()
         if user.is_superuser or user.has_perm('ganeti.view_instances'):
+            return self.get_instances()
+        instances = self._get_visible_instances(user)
+        if instances is not None:
+            self._stale.discard('instances')
             return instances
-        else:
-            user = User.objects.filter(pk=user.pk).select_related(
-                'groups'
-            ).get()
-            ugroups = []
-            for ug in user.groups.all():
-                ugroups.append(ug.pk)
-            return [
-                i for i in instances if (
-                    user in i.users or
-                    len(
-                        list(set(ugroups).intersection(
-                            set([g.id for g in i.groups]))
-                        )
-                    ) > 0
-                )
-            ]
-
-    def get_cluster_info(self):
-        info = cache.get("cluster:%s:info" % self.slug)
+        # No fresh snapshot, scan the instances (refreshing them if needed)
+        ugroups = set(user.groups.values_list('pk', flat=True))
+        return [
+            i for i in self.get_instances() if (
+                user in i.users or
+                ugroups.intersection([g.id for g in i.groups])
+            )
+        ]
 
-        if info is None:
-            info = self._client.GetInfo()
-            if 'ctime' in info and info['ctime']:
-                info['ctime'] = datetime.fromtimestamp(info['ctime'])
-            if 'mtime' in info and info['mtime']:
-                info['mtime'] = datetime.fromtimestamp(info['mtime'])
-            cache.set("cluster:%s:info" % self.slug, info, 180)
+    def _fetch_cluster_info(self):
+        info = self._client.GetInfo()
+        if 'ctime' in info and info['ctime']:
+            info['ctime'] = datetime.fromtimestamp(info['ctime'])
+        if 'mtime' in info and info['mtime']:
+            info['mtime'] = datetime.fromtimestamp(info['mtime'])
+        return info
 
+    def refresh_cluster_info(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        info = self._fetch_cluster_info()
+        self._store('info', info, timeout)
         return info
 
+    def get_cluster_info(self):
+        return self._get_or_refresh('info', self.refresh_cluster_info)
+
     def list_cluster_nodes(self):
         nodes = cache.get("cluster:%s:listnodes" % self.slug)
         if nodes is None:
@@ -575,63 +1014,53 @@ class Cluster(models.Model):
             cache.set("cluster:%s:listnodes" % self.slug, nodes, 180)
         return nodes
 
-    def get_cluster_nodes(self):
-        nodes = cache.get("cluster:%s:nodes" % self.slug)
-        if nodes is None:
-            cachenodes = []
-            nodes = parseQuery(
-                self._client.Query(
-                    'node',
-                    [
-                        'name',
-                        'role',
-                        'mfree',
-                        'mtotal',
-                        'dtotal',
-                        'dfree',
-                        'ctotal',
-                        'group',
-                        'pinst_cnt',
-                        'offline',
-                        'vm_capable',
-                        'pinst_list'
-                    ]))
-            for info in nodes:
-                info['cluster'] = self.slug
-                if info['mfree'] is None:
-                    info['mfree'] = 0
-                if info['mtotal'] is None:
-                    info['mtotal'] = 0
-                if info['dtotal'] is None:
-                    info['dtotal'] = 0
-                if info['dfree'] is None:
-                    info['dfree'] = 0
-                try:
-                    info['mem_used'] = 100 * (
-                        info['mtotal'] - info['mfree']
-                    ) / info['mtotal']
-                except ZeroDivisionError:
-                    '''this is the case where the node is offline and reports
-                    none, thus it is 0'''
-                    info['mem_used'] = 0
-                try:
-                    info['disk_used'] = 100 * (
-                        info['dtotal'] - info['dfree']
-                    ) / info['dtotal']
-                except ZeroDivisionError:
-                    '''this is the case where the node is offline and reports
-                    none, thus it is 0'''
-                    info['disk_used'] = 0
+    def _fetch_cluster_nodes(self):
+        cachenodes = []
+        nodes = self._client.QueryIter('node', NODE_FIELDS)
+        for info in nodes:
+            info['cluster'] = self.slug
+            if info['mfree'] is None:
+                info['mfree'] = 0
+            if info['mtotal'] is None:
+                info['mtotal'] = 0
+            if info['dtotal'] is None:
+                info['dtotal'] = 0
+            if info['dfree'] is None:
+                info['dfree'] = 0
+            try:
+                info['mem_used'] = 100 * (
+                    info['mtotal'] - info['mfree']
+                ) / info['mtotal']
+            except ZeroDivisionError:
+                '''this is the case where the node is offline and reports
+                none, thus it is 0'''
+                info['mem_used'] = 0
+            try:
+                info['disk_used'] = 100 * (
+                    info['dtotal'] - info['dfree']
+                ) / info['dtotal']
+            except ZeroDivisionError:
+                '''this is the case where the node is offline and reports
+                none, thus it is 0'''
+                info['disk_used'] = 0
+            info['shared_storage'] = False
+            if self.default_disk_template in ['drbd', 'plain']:
                 info['shared_storage'] = False
-                if self.default_disk_template in ['drbd', 'plain']:
-                    info['shared_storage'] = False
-                if self.default_disk_template in ['sharedfile', 'blockdev']:
-                    info['shared_storage'] = True
-                cachenodes.append(info)
-            nodes = cachenodes
-            cache.set("cluster:%s:nodes" % self.slug, nodes, 180)
+            if self.default_disk_template in ['sharedfile', 'blockdev']:
+                info['shared_storage'] = True
+            cachenodes.append(info)
+        return cachenodes
+
+    def refresh_cluster_nodes(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        nodes = self._fetch_cluster_nodes()
+        self._store('nodes', nodes, timeout)
+        self._update_node_index(timeout)
         return nodes
 
+    def get_cluster_nodes(self):
+        return self._get_or_refresh('nodes', self.refresh_cluster_nodes)
+
     def get_available_nodes(self, node_group, number_of_nodes):
         ret_nodes = []
         nodes = self.get_cluster_nodes()
@@ -645,20 +1074,179 @@ class Cluster(models.Model):
             ret_nodes.append(n['name'])
         return ret_nodes[0:number_of_nodes]
 
+    def _fetch_node_groups(self):
+        #return parseQuery(self._client.Query('group',['name', 'tags']))
+        return self._client.GetGroups(bulk=True)
+
+    def refresh_node_groups(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        info = self._fetch_node_groups()
+        self._store('nodegroups', info, timeout)
+        self._update_node_index(timeout)
+        return info
+
     def get_node_groups(self):
-        info = cache.get('cluster:%s:nodegroups' % self.slug)
-        if info is None:
-            #info = parseQuery(self._client.Query('group',['name', 'tags']))
-            info = self._client.GetGroups(bulk=True)
-            cache.set('cluster:%s:nodegroups' % self.slug, info, 180)
+        return self._get_or_refresh('nodegroups', self.refresh_node_groups)
+
+    def _build_node_index(self, nodes, groups):
+        '''Indexes the nodes by name, the lock flag of the node groups by
+        name and collects the nodes of the locked node groups'''
+        index = {'nodes': {}, 'groups': {}, 'locked_nodes': set()}
+        for group in groups:
+            index['groups'][group['name']] = 'locked' in (
+                group.get('tags') or []
+            )
+        for node in nodes:
+            index['nodes'][node['name']] = node
+            if index['groups'].get(node['group']):
+                index['locked_nodes'].add(node['name'])
+        return index
+
+    def _update_node_index(self, timeout):
+        '''Rebuilds the node index after the nodes or the node groups have
+        been refreshed, if both of them are cached'''
+        nodes = cache.get(self._cache_key('nodes'))
+        groups = cache.get(self._cache_key('nodegroups'))
+        if nodes is None or groups is None:
+            return
+        self._store(
+            'nodeindex',
+            self._build_node_index(nodes[1], groups[1]),
+            timeout
+        )
+        self._node_index = None
+
+    def refresh_node_index(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        index = self._build_node_index(
+            self.get_cluster_nodes(),
+            self.get_node_groups()
+        )
+        self._store('nodeindex', index, timeout)
+        return index
+
+    def get_node_index(self):
+        '''Returns the node index of the cluster, which is read once every
+        NODE_INDEX_MEMO_TIMEOUT seconds by every Cluster object'''
+        if self._node_index is None or self._node_index[0] <= time():
+            self._node_index = (
+                time() + NODE_INDEX_MEMO_TIMEOUT,
+                self._get_or_refresh('nodeindex', self.refresh_node_index)
+            )
+        return self._node_index[1]
+
+    def _fetch_networks(self):
+        return self._client.GetNetworks(bulk=True)
+
+    def refresh_networks(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        info = self._fetch_networks()
+        self._store('networks', info, timeout)
         return info
 
     def get_networks(self):
-        info = cache.get('cluster:%s:networks' % self.slug)
-        if info is None:
-            info = self._client.GetNetworks(bulk=True)
-            cache.set('cluster:%s:networks' % self.slug, info, 180)
-        return info
+        return self._get_or_refresh('networks', self.refresh_networks)
+
+    def _build_profile(self):
+        '''The cluster overview: info, node group stack, nodes and networks'''
+        info = dict(self.get_cluster_info())
+        info['mtime'] = str(info['mtime'])
+        info['ctime'] = str(info['ctime'])
+        return {
+            'slug': self.slug,
+            'description': self.description,
+            'hostname': self.hostname,
+            'clusterinfo': info,
+            'nodegroups': self.get_node_group_stack(),
+            'nodes': self.get_cluster_nodes(),
+            'networks': self.get_networks()
+        }
+
+    def refresh_profile(self, timeout=None):
+        timeout = timeout or CLUSTER_CACHE_TIMEOUT
+        profile = self._build_profile()
+        self._store('profile', profile, timeout)
+        return profile
+
+    def get_profile(self):
+        return self._get_or_refresh('profile', self.refresh_profile)
+
+    @classmethod
+    def get_fresh(cls, clusters, what):
+        '''Reads the cluster:<slug>:<what> values of several clusters in a
+        single round trip. Returns a dict of slug to value, for the clusters
+        whose value is fresh'''
+        clusters = list(clusters)
+        entries = cache.get_many(
+            [cluster._cache_key(what) for cluster in clusters]
+        )
+        now = time()
+        fresh = {}
+        for cluster in clusters:
+            entry = entries.get(cluster._cache_key(what))
+            if entry is not None and entry[0] > now:
+                fresh[cluster.slug] = entry[1]
+        return fresh
+
+    def query(self, what, fields, qfilter=None, timeout=None):
+        '''Returns the given fields of every resource of a kind ('instance',
+        'node', ...), or of the ones matching a query filter, as a list of
+        dicts. A fresh snapshot holding all the fields answers unfiltered
+        queries, otherwise only these fields are queried and the result is
+        cached under a key of the field set and the filter'''
+        fields = sorted(set(fields))
+        snapshot = QUERY_SNAPSHOTS.get(what)
+        if (
+            qfilter is None and
+            snapshot is not None and
+            set(fields).issubset(snapshot[1])
+        ):
+            entry = cache.get(self._cache_key(snapshot[0]))
+            if entry is not None and entry[0] > time():
+                return [
+                    dict([(field, record.get(field)) for field in fields])
+                    for record in entry[1]
+                ]
+        timeout = timeout or INSTANCES_CACHE_TIMEOUT
+        key = 'query:%s:%s' % (what, hashlib.sha1(
+            json.dumps([fields, qfilter], sort_keys=True)
+        ).hexdigest())
+
+        def _refresh():
+            records = list(self._client.QueryIter(what, fields, qfilter))
+            self._store(key, records, timeout)
+            return records
+        return self._get_or_refresh(key, _refresh)
+
+    def refresh_cache(self, timeout=None):
+        '''Refreshes all the cached inventory of the cluster. This is what the
+        poller calls on every run, so that web requests only have to read the
+        cluster:<slug>:* keys. A timeout overrides the default lifetime of
+        every refreshed key. A failing key does not keep the rest from
+        being refreshed; the failures are raised once all were tried'''
+        failed = []
+        for (what, refresh) in [
+            ('instances', self.refresh_instances),
+            ('nodes', self.refresh_cluster_nodes),
+            ('nodegroups', self.refresh_node_groups),
+            ('info', self.refresh_cluster_info),
+            ('networks', self.refresh_networks),
+            ('profile', self.refresh_profile),
+        ]:
+            try:
+                refresh(timeout)
+            except Exception, err:
+                logger.warn(
+                    "Error refreshing %s of cluster %s: %s" %
+                    (what, self.slug, err)
+                )
+                failed.append(what)
+        if failed:
+            raise GanetiApiError(
+                "Failed to refresh %s of cluster %s" %
+                (", ".join(failed), self.slug)
+            )
+        return self.get_snapshot_version()
 
     def get_node_group_networks(self, nodegroup):
         # This gets networks per nodegroup as received via a GetNetworks RAPI
@@ -733,25 +1321,140 @@ class Cluster(models.Model):
     def get_cluster_instances(self):
         return self._client.GetInstances()
 
-    def get_job_list(self):
-        info = self._client.GetJobs(bulk=True)
-        for i in info:
-            i['cluster'] = self.slug
-            i['start_time'] = "%s" % (
+    def _format_job(self, job):
+        job['cluster'] = self.slug
+        job['start_time'] = ''
+        if job.get('start_ts'):
+            job['start_time'] = "%s" % (
                 datetime.fromtimestamp(
-                    int(i['start_ts'][0])
+                    int(job['start_ts'][0])
                 ).strftime('%Y-%m-%d %H:%M:%S')
             )
-            i['ops'][0]['OP_ID'] = i['ops'][0]['OP_ID'].replace(
+        if job.get('ops'):
+            job['ops'][0]['OP_ID'] = job['ops'][0]['OP_ID'].replace(
                 "OP_", ''
             ).replace("_", ' ').lower().capitalize()
-        return info
+        return job
+
+    def _job_key(self, job_id):
+        return self._cache_key('job:%s' % job_id)
+
+    def _cache_jobs(self, jobs, timeout):
+        '''Caches the job records. Finalized jobs can no longer change, so
+        they are kept longer than the pending ones'''
+        final = {}
+        pending = {}
+        for job in jobs:
+            if job['status'] in JOB_STATUS_FINALIZED:
+                final[self._job_key(job['id'])] = job
+            else:
+                pending[self._job_key(job['id'])] = job
+        if final:
+            cache.set_many(final, FINALIZED_JOB_CACHE_TIMEOUT)
+        if pending:
+            cache.set_many(pending, timeout + STALE_CACHE_TIMEOUT)
+
+    def _fetch_jobs(self, job_ids=None):
+        query = None
+        if job_ids is not None:
+            query = ["|"] + [["=", "id", job_id] for job_id in job_ids]
+        return [
+            self._format_job(job)
+            for job in self._client.QueryIter('job', JOB_FIELDS, query)
+        ]
+
+    def refresh_jobs(self, timeout=None):
+        '''Syncs the job feed of the cluster with its job queue. Only the
+        job ids are listed every time; records are fetched just for the new
+        jobs and for the ones that were not finalized yet. Every change bumps
+        the feed serial, which is what the feed cursors refer to'''
+        timeout = timeout or JOBS_CACHE_TIMEOUT
+        entry = cache.get(self._cache_key('jobs'))
+        if entry is not None:
+            feed = entry[1]
+        else:
+            feed = {'serial': 0, 'jobs': {}}
+        known = feed['jobs']
+        job_ids = set(int(job_id) for job_id in self._client.GetJobs())
+        fetch = [
+            job_id for job_id in job_ids
+            if job_id not in known or
+            known[job_id][0] not in JOB_STATUS_FINALIZED
+        ]
+        jobs = []
+        if len(fetch) > len(job_ids) / 2:
+            jobs = self._fetch_jobs()
+        elif fetch:
+            jobs = self._fetch_jobs(fetch)
+        self._cache_jobs(jobs, timeout)
+        # Millisecond serials keep growing even if the feed is rebuilt
+        serial = max(feed['serial'] + 1, int(time() * 1000))
+        changed = False
+        for job in jobs:
+            if known.get(job['id'], (None, None))[0] != job['status']:
+                known[job['id']] = (job['status'], serial)
+                changed = True
+        # Archived jobs are gone from the queue, so are their records
+        archived = set(known) - job_ids
+        if archived:
+            cache.delete_many(
+                [self._job_key(job_id) for job_id in archived] +
+                [self._cache_key('jobstatus:%s' % job_id)
+                    for job_id in archived]
+            )
+            for job_id in archived:
+                del known[job_id]
+        if changed:
+            feed['serial'] = serial
+        self._store('jobs', feed, timeout)
+        return feed
+
+    def get_job_feed(self, cursor=None):
+        '''Returns the jobs of the cluster that are new or changed status
+        after cursor (all of them if cursor is None), along with the cursor
+        to ask for the next changes'''
+        feed = self._get_or_refresh('jobs', self.refresh_jobs)
+        job_ids = [
+            job_id for job_id, (status, serial) in feed['jobs'].iteritems()
+            if cursor is None or serial > cursor
+        ]
+        records = cache.get_many([self._job_key(job_id) for job_id in job_ids])
+        jobs = []
+        missing = []
+        for job_id in job_ids:
+            job = records.get(self._job_key(job_id))
+            if job is None:
+                missing.append(job_id)
+            else:
+                jobs.append(job)
+        if missing:
+            if len(missing) > len(feed['jobs']) / 2:
+                # Listing all the jobs is cheaper than a filter this long
+                wanted = set(missing)
+                fetched = [
+                    job for job in self._fetch_jobs() if job['id'] in wanted
+                ]
+            else:
+                fetched = self._fetch_jobs(missing)
+            self._cache_jobs(fetched, JOBS_CACHE_TIMEOUT)
+            jobs.extend(fetched)
+        jobs.sort(key=lambda job: job['id'])
+        return jobs, feed['serial']
+
+    def get_job_list(self):
+        return self.get_job_feed()[0]
 
     def get_job(self, job_id):
-        return self._client.GetJobStatus(job_id)
+        key = self._cache_key('jobstatus:%s' % job_id)
+        job = cache.get(key)
+        if job is None:
+            job = self._client.GetJobStatus(job_id)
+            if job['status'] in JOB_STATUS_FINALIZED:
+                cache.set(key, job, FINALIZED_JOB_CACHE_TIMEOUT)
+        return job
 
     def get_cluster_instances_detail(self):
-        return self._client.GetInstances(bulk=True)
+        return list(self._client.GetInstancesIter())
 
     def get_node_group_info(self, nodegroup):
         info = cache.get("cluster:%s:nodegroup:%s" % (self.slug, nodegroup))
@@ -765,56 +1468,33 @@ class Cluster(models.Model):
         return info
 
     def get_node_info(self, node):
-        info = cache.get("cluster:%s:node:%s" % (self.slug, node))
-        if info is None:
-            for info in self.get_cluster_nodes():
-                if info['name'] == node:
-                    cache.set("cluster:%s:node:%s" % (
-                        self.slug,
-                        node
-                    ), info, 180)
-                    return info
-        return info
+        return self.get_node_index()['nodes'].get(node)
 
-    def get_instance_info(self, instance):
+    def get_instance_info(self, instance, fresh=False):
+        '''Returns the record of an instance from the cached snapshot index.
+        RAPI is only queried when the instance is not indexed or when fresh
+        data is asked for'''
         cache_key = self._instance_cache_key(instance)
-        info = cache.get(cache_key)
+        info = None
+        if not fresh:
+            info = cache.get(cache_key)
 
         if info is None:
             try:
                 info = parseQuery(
                     self._client.Query(
                         'instance',
-                        [
-                            'name',
-                            'tags',
-                            'pnode',
-                            'disk.sizes',
-                            'nic.modes',
-                            'nic.ips',
-                            'nic.links',
-                            'status',
-                            'admin_state',
-                            'beparams',
-                            'oper_state',
-                            'hvparams',
-                            'nic.macs',
-                            'ctime',
-                            'mtime',
-                            'osparams',
-                            'os',
-                            'network_port'
-                        ],
+                        INSTANCE_FIELDS,
                         ["|", ["=", "name", "%s" % instance]]
                     ))[0]
                 cache.set(cache_key, info, 3)
-            except GanetiApiError:
+            except (GanetiApiError, IndexError):
                 info = None
         return info
 
     def setup_vnc_forwarding(self, instance):
         password = User.objects.make_random_password(length=8)
-        info = self.get_instance_info(instance)
+        info = self.get_instance_info(instance, fresh=True)
 
         port = info['network_port']
         node = info['pnode']
@@ -824,7 +1504,7 @@ class Cluster(models.Model):
 
     def setup_novnc_forwarding(self, instance, sport=0, tls=False):
         password = User.objects.make_random_password(length=8)
-        info = self.get_instance_info(instance)
+        info = self.get_instance_info(instance, fresh=True)
         port = info['network_port']
         node = info['pnode']
         node_ip = gethostbyname(node)
@@ -920,19 +1600,10 @@ class Cluster(models.Model):
             return False
 
     def check_node_group_lock_by_node(self, node):
-        n = self.get_node_info(node)
-        ng = self.get_node_group_info(n['group'])
-        for t in ng['tags']:
-            if t == 'locked':
-                return True
-        return False
+        return node in self.get_node_index()['locked_nodes']
 
     def has_locked_nodes(self):
-        groups = self.get_node_groups()
-        for group in groups:
-            if 'locked' in group.get('tags'):
-                return True
-        return False
+        return True in self.get_node_index()['groups'].values()
 
     def destroy_instance(self, instance):
         cache_key = self._instance_cache_key(instance)
@@ -1047,6 +1718,20 @@ class Cluster(models.Model):
     def get_job_status(self, job_id):
         return self._client.GetJobStatus(job_id)
 
+    def wait_for_job_change(self, job_id, status=None):
+        '''Long-polls a job until its status is other than the given one.
+        Returns the new status, or None if it did not change before the
+        cluster gave up waiting (about 10 seconds)'''
+        result = self._client.WaitForJobChange(
+            job_id,
+            ['status'],
+            status is not None and [status] or None,
+            None
+        )
+        if result is None:
+            return None
+        return result['job_info'][0]
+
     def get_default_network(self):
         try:
             return self.network_set.get(cluster_default=True)
@@ -1082,6 +1767,156 @@ class Network(models.Model):
         super(Network, self).save()
 
 
+_TAG_PREFIX = "%s:" % GANETI_TAG_PREFIX
+# <kind> of the <prefix>:<kind>:<value> tags -> (parsed key, many values)
+_TAG_VALUES = {
+    'user': ('users', True),
+    'group': ('groups', True),
+    'service': ('services', True),
+    'org': ('organization', False),
+    'application': ('application', False),
+    'whitelist_ip': ('whitelistip', False),
+}
+# <kind> of the <prefix>:<kind> flag tags
+_TAG_FLAGS = frozenset(['adminlock', 'isolate', 'needsreboot'])
+TAG_MEMO_SIZE = 10000
+_tag_memo = {}
+
+
+def parse_instance_tags(tags):
+    '''Parses the ganetimgr tags of an instance into the names and flags
+    they carry. Results are memoized per tag set, since most instances share
+    theirs with others, and must not be modified'''
+    key = tuple(tags)
+    parsed = _tag_memo.get(key)
+    if parsed is not None:
+        return parsed
+    parsed = {
+        'users': [],
+        'groups': [],
+        'services': [],
+        'organization': None,
+        'application': None,
+        'whitelistip': None,
+        'adminlock': False,
+        'isolate': False,
+        'needsreboot': False,
+    }
+    prefix_len = len(_TAG_PREFIX)
+    for tag in key:
+        if not tag.startswith(_TAG_PREFIX):
+            continue
+        kind, sep, value = tag[prefix_len:].partition(':')
+        if sep:
+            if kind in _TAG_VALUES:
+                name, many = _TAG_VALUES[kind]
+                if many:
+                    parsed[name].append(value)
+                else:
+                    parsed[name] = value
+        elif kind in _TAG_FLAGS:
+            parsed[kind] = True
+    if len(_tag_memo) >= TAG_MEMO_SIZE:
+        _tag_memo.clear()
+    _tag_memo[key] = parsed
+    return parsed
+
+
+EUI64_MEMO_SIZE = 100000
+_eui64_memo = {}
+
+
+def eui64_address(prefix, mac):
+    '''Returns the EUI-64 IPv6 address of mac in prefix, or None if either of
+    them is invalid. Results are memoized per (prefix, mac)'''
+    key = (prefix, mac)
+    try:
+        return _eui64_memo[key]
+    except KeyError:
+        pass
+    try:
+        prefix_parts = ipaddr.IPv6Network(prefix).network.exploded.split(':')
+        mac_parts = mac.split(":")
+        eui64 = mac_parts[:3] + ["ff", "fe"] + mac_parts[3:]
+        eui64[0] = "%02x" % (int(eui64[0], 16) ^ 0x02)
+        ip = ":".join(prefix_parts[:4])
+        for l in range(0, len(eui64), 2):
+            ip += ":%s" % "".join(eui64[l:l + 2])
+        address = ipaddr.IPAddress(ip).compressed
+    except (AttributeError, IndexError, TypeError, ValueError):
+        # ipaddr's address and netmask errors are ValueErrors
+        address = None
+    if len(_eui64_memo) >= EUI64_MEMO_SIZE:
+        _eui64_memo.clear()
+    _eui64_memo[key] = address
+    return address
+
+
+def nic_ipv6s(info, prefixes):
+    '''Returns the IPv6 addresses of the NICs of an instance record whose
+    link has a prefix in prefixes (link -> IPv6 prefix)'''
+    ipv6s = []
+    links = info.get('nic.links') or []
+    macs = info.get('nic.macs') or []
+    for link, mac in zip(links, macs):
+        prefix = prefixes.get(link)
+        if not prefix:
+            continue
+        address = eui64_address(prefix, mac)
+        if address:
+            ipv6s.append(address)
+    return ipv6s
+
+
+def _instance_resources(info):
+    '''Returns the owners of an instance record and the resources it
+    accounts to each of them: (instances, cpu, memory, disk)'''
+    beparams = info.get('beparams') or {}
+    return (
+        tuple(parse_instance_tags(info.get('tags', ()))['users']),
+        (
+            1,
+            int(beparams.get('vcpus') or 0),
+            int(beparams.get('maxmem') or 0),
+            sum(info.get('disk.sizes') or [])
+        )
+    )
+
+
+def _account_resources(users, resources, sign):
+    owners, amounts = resources
+    for owner in owners:
+        totals = users.setdefault(
+            owner,
+            {'instances': 0, 'cpu': 0, 'memory': 0, 'disk': 0}
+        )
+        totals['instances'] += sign * amounts[0]
+        totals['cpu'] += sign * amounts[1]
+        totals['memory'] += sign * amounts[2]
+        totals['disk'] += sign * amounts[3]
+        if totals['instances'] <= 0:
+            del users[owner]
+
+
+# Built Instance objects of every cluster in this process:
+# slug -> (snapshot version, valid until, instances)
+_instances_memo = {}
+
+
+def _release_lock(key, token):
+    '''Releases a lock taken with cache.add(). The lock could have expired
+    and be someone else's by now, so it is only deleted if it holds token'''
+    delete_if_equal = getattr(cache, 'delete_if_equal', None)
+    if delete_if_equal is not None:
+        delete_if_equal(key, token)
+    elif cache.get(key) == token:
+        cache.delete(key)
+
+
+def _instance_cluster_key(instance):
+    return "instance:%s:cluster" % instance
+
+
 def preload_instance_data():
     networks = cache.get('networklist')
     if not networks:
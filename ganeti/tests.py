@@ -0,0 +1,733 @@
+# -*- coding: utf-8 -*- vim:fileencoding=utf-8:
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gzip
+import json
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from cStringIO import StringIO
+
+from django.contrib.auth.models import User, Group
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.client import Client
+
+from util.client import (
+    GanetiApiError,
+    GanetiRapiClient,
+    _CurlPool,
+    _JsonStreamDecoder
+)
+from auditlog.models import AuditEntry
+from ganeti import models
+from ganeti.models import Cluster
+from ganeti.utils import (
+    DataTablesQuery,
+    INSTANCE_DETAIL_URL,
+    USER_INFO_URL,
+    GRAPH_URL,
+    NIC_GRAPH_URL
+)
+
+
+class UrlTemplateTest(TestCase):
+    def test_instance_detail(self):
+        for instance in [
+            'vm1.example.com',
+            u'vm-α.example.com',
+            'vm with spaces',
+        ]:
+            self.assertEqual(
+                INSTANCE_DETAIL_URL(cluster_slug='cl1', instance=instance),
+                reverse(
+                    'instance-detail',
+                    kwargs={'cluster_slug': 'cl1', 'instance': instance}
+                )
+            )
+
+    def test_user_info(self):
+        for usergroup in ['user', 'first.last@example.com', 'a-group']:
+            for type in ['user', 'group']:
+                self.assertEqual(
+                    USER_INFO_URL(type=type, usergroup=usergroup),
+                    reverse(
+                        'user-info',
+                        kwargs={'type': type, 'usergroup': usergroup}
+                    )
+                )
+
+    def test_graph(self):
+        self.assertEqual(
+            GRAPH_URL('cl1', 'vm1.example.com', 'cpu-ts'),
+            reverse('graph', args=('cl1', 'vm1.example.com', 'cpu-ts'))
+        )
+        for nic in range(3):
+            self.assertEqual(
+                NIC_GRAPH_URL(
+                    'cl1',
+                    'vm1.example.com',
+                    'net-ts',
+                    '/eth%s' % nic
+                ),
+                reverse(
+                    'graph',
+                    args=('cl1', 'vm1.example.com', 'net-ts', '/eth%s' % nic)
+                )
+            )
+
+
+class FakeCurl(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class CurlPoolTest(TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.pool = _CurlPool(2, max_idle=60, _time_fn=lambda: self.now)
+
+    def test_reuse(self):
+        self.assertEqual(self.pool.Get(), None)
+        first, second = FakeCurl(), FakeCurl()
+        self.pool.Put(first)
+        self.pool.Put(second)
+        # The most recently used handle is the first to be reused
+        self.assertTrue(self.pool.Get() is second)
+        self.assertTrue(self.pool.Get() is first)
+        self.assertEqual(self.pool.Get(), None)
+
+    def test_size_limit(self):
+        handles = [FakeCurl() for i in range(3)]
+        for handle in handles:
+            self.pool.Put(handle)
+        self.assertTrue(handles[0].closed)
+        self.assertFalse(handles[1].closed or handles[2].closed)
+
+    def test_idle_timeout(self):
+        old, recent = FakeCurl(), FakeCurl()
+        self.pool.Put(old)
+        self.now += 50
+        self.pool.Put(recent)
+        self.now += 20
+        self.assertTrue(self.pool.Get() is recent)
+        self.assertTrue(old.closed)
+        self.assertEqual(self.pool.Get(), None)
+
+
+class GzipRapiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    instances = [
+        {'name': 'vm%d.example.com' % i, 'beparams': {'vcpus': 1}}
+        for i in range(500)
+    ]
+
+    def do_GET(self):
+        self.server.encodings.append(self.headers.get('Accept-Encoding'))
+        body = json.dumps(self.instances)
+        self.send_response(200)
+        if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RapiCompressionTest(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), GzipRapiHandler)
+        self.server.encodings = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_client(self, compression):
+        client = GanetiRapiClient(
+            '127.0.0.1',
+            port=self.server.server_port,
+            curl_pool_size=0,
+            compression=compression
+        )
+        # The fake server does not speak TLS
+        client._base_url = 'http://127.0.0.1:%d' % self.server.server_port
+        return client
+
+    def test_compressed(self):
+        client = self.get_client(True)
+        self.assertEqual(
+            client.GetInstances(bulk=True),
+            GzipRapiHandler.instances
+        )
+        self.assertTrue('gzip' in self.server.encodings[-1])
+        self.assertEqual(
+            list(client.GetInstancesIter()),
+            GzipRapiHandler.instances
+        )
+
+    def test_uncompressed(self):
+        client = self.get_client(False)
+        self.assertEqual(
+            client.GetInstances(bulk=True),
+            GzipRapiHandler.instances
+        )
+        self.assertEqual(self.server.encodings, [None])
+
+
+class JsonStreamDecoderTest(TestCase):
+    def _decode(self, chunks, key=None):
+        decoder = _JsonStreamDecoder(key)
+        items = []
+        for chunk in chunks:
+            decoder.Feed(chunk)
+            items.extend(decoder.Pop())
+        other = decoder.Finish()
+        items.extend(decoder.Pop())
+        return items, other
+
+    def test_split_everywhere(self):
+        for (data, key) in [
+            ('[1, 2.5, -3e-2, 1E+5, true, null, "a,]", [4, {"b": 5}]]', None),
+            ('[1e5]', None),
+            ('{"total": 2, "data": [{"id": 1.25}, -0.5], "x": "y"}', 'data'),
+        ]:
+            expected = json.loads(data)
+            if key is not None:
+                expected_other = dict(expected)
+                expected = expected_other.pop(key)
+            else:
+                expected_other = {}
+            for offset in range(len(data) + 1):
+                items, other = self._decode(
+                    [data[:offset], data[offset:]],
+                    key
+                )
+                self.assertEqual(items, expected)
+                self.assertEqual(other, expected_other)
+            items, other = self._decode(list(data), key)
+            self.assertEqual(items, expected)
+
+    def test_truncated(self):
+        for data in ['[1, 2', '[1, 2.', '[1, {"a": ']:
+            self.assertRaises(ValueError, self._decode, [data])
+
+
+class DataTablesQuerysetTest(TestCase):
+    fields = {'cluster': 'cluster', 'instance': 'instance'}
+
+    def setUp(self):
+        user = User.objects.create(username='user')
+        for cluster in ['cl1', 'cl10', 'cl2', 'cl3']:
+            AuditEntry.objects.create(
+                requester=user,
+                action='reboot',
+                instance='vm.%s.example.com' % cluster,
+                cluster=cluster
+            )
+
+    def _clusters(self, search, regex=True):
+        query = DataTablesQuery({
+            'sEcho': '1',
+            'iColumns': '2',
+            'mDataProp_0': 'instance',
+            'mDataProp_1': 'cluster',
+            'sSearch_1': search,
+            'bRegex_1': 'true' if regex else 'false',
+            'iSortingCols': '1',
+            'iSortCol_0': '1',
+        })
+        total, displayed, entries = query.filter_queryset(
+            AuditEntry.objects.all(),
+            self.fields
+        )
+        self.assertEqual(total, 4)
+        clusters = [entry.cluster for entry in entries]
+        self.assertEqual(displayed, len(clusters))
+        return clusters
+
+    def test_cluster_choice(self):
+        self.assertEqual(self._clusters('cl1|cl2'), ['cl1', 'cl2'])
+        self.assertEqual(self._clusters('cl1'), ['cl1'])
+        self.assertEqual(self._clusters(''), ['cl1', 'cl10', 'cl2', 'cl3'])
+
+    def test_text(self):
+        self.assertEqual(self._clusters('cl1', regex=False), ['cl1', 'cl10'])
+
+    def test_regex(self):
+        self.assertEqual(self._clusters('^cl[23]$'), ['cl2', 'cl3'])
+
+
+class FakeCache(object):
+    '''The part of the cache API the cluster cache uses, without
+    expiration'''
+
+    def __init__(self):
+        self.data = {}
+        self.timeouts = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+        self.timeouts[key] = timeout
+
+    def add(self, key, value, timeout=None):
+        if key in self.data:
+            return False
+        self.set(key, value, timeout)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def get_many(self, keys):
+        return dict([
+            (key, self.data[key]) for key in keys if key in self.data
+        ])
+
+    def set_many(self, data, timeout=None):
+        for key, value in data.items():
+            self.set(key, value, timeout)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
+
+class FakeRapiClient(object):
+    '''Answers the queries of a cluster from a list of records per kind of
+    resource, and keeps the filters it was queried with'''
+
+    def __init__(self):
+        self.records = {'instance': [], 'job': []}
+        self.queries = []
+
+    def Query(self, what, fields, qfilter=None):
+        self.queries.append((what, qfilter))
+        records = self.records[what]
+        if qfilter is not None:
+            # Only ["|", ["=", field, value], ...] filters are used
+            records = [
+                record for record in records
+                if [
+                    True for (_, field, value) in qfilter[1:]
+                    if record.get(field) == value
+                ]
+            ]
+        return {
+            'fields': [{'name': field} for field in fields],
+            'data': [
+                [[0, record.get(field)] for field in fields]
+                for record in records
+            ],
+        }
+
+    def QueryIter(self, what, fields, qfilter=None):
+        return iter(models.parseQuery(self.Query(what, fields, qfilter)))
+
+    def GetJobs(self):
+        return [job['id'] for job in self.records['job']]
+
+    def GetJobStatus(self, job_id):
+        self.queries.append(('jobstatus', job_id))
+        for job in self.records['job']:
+            if job['id'] == int(job_id):
+                return dict(job)
+        raise GanetiApiError('Job %s not found' % job_id, code=404)
+
+
+class ClusterCacheTestCase(TestCase):
+    '''Runs a cluster against a fake cache, clock and RAPI client'''
+
+    def setUp(self):
+        self.cache = FakeCache()
+        self.client = FakeRapiClient()
+        self.now = 1000.0
+        self.slept = []
+        self.patched = {
+            'cache': models.cache,
+            'time': models.time,
+            'sleep': models.sleep,
+            'GanetiRapiClient': models.GanetiRapiClient,
+        }
+        models.cache = self.cache
+        models.time = lambda: self.now
+        models.sleep = self.sleep
+        models.GanetiRapiClient = lambda *args, **kwargs: self.client
+        self.cluster = Cluster.objects.create(
+            hostname='cl1.example.com',
+            slug='cl1',
+            description='Cluster 1'
+        )
+
+    def tearDown(self):
+        for name, value in self.patched.items():
+            setattr(models, name, value)
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class GetOrRefreshTest(ClusterCacheTestCase):
+    def setUp(self):
+        super(GetOrRefreshTest, self).setUp()
+        self.key = self.cluster._cache_key('info')
+        self.lock_key = '%s:refreshlock' % self.key
+        self.refreshed = 0
+
+    def refresh(self):
+        self.refreshed += 1
+        self.cluster._store('info', 'new', 10)
+        return 'new'
+
+    def get(self):
+        return self.cluster._get_or_refresh('info', self.refresh)
+
+    def test_fresh(self):
+        self.cluster._store('info', 'old', 10)
+        self.assertEqual(self.get(), 'old')
+        self.assertEqual(self.refreshed, 0)
+        self.assertFalse(self.cluster.is_stale('info'))
+
+    def test_expired(self):
+        self.cluster._store('info', 'old', 10)
+        self.now += 20
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.refreshed, 1)
+        self.assertFalse(self.lock_key in self.cache.data)
+
+    def test_stale_while_refreshing(self):
+        self.cluster._store('info', 'old', 10)
+        self.now += 20
+        self.cache.add(self.lock_key, 'other', 30)
+        self.assertEqual(self.get(), 'old')
+        self.assertEqual(self.refreshed, 0)
+        self.assertTrue(self.cluster.is_stale('info'))
+
+    def test_wait_for_holder(self):
+        self.cache.add(self.lock_key, 'other', 30)
+
+        def holder_done(seconds):
+            self.cluster._store('info', 'theirs', 10)
+            self.cache.delete(self.lock_key)
+        models.sleep = holder_done
+        self.assertEqual(self.get(), 'theirs')
+        self.assertEqual(self.refreshed, 0)
+
+    def test_holder_just_released(self):
+        cluster = self.cluster
+
+        class RacingCache(FakeCache):
+            def add(self, key, value, timeout=None):
+                # The holder stores its value and releases the lock right
+                # before this caller tries to take it
+                cluster._store('info', 'theirs', 10)
+                return False
+        models.cache = RacingCache()
+        self.assertEqual(self.get(), 'theirs')
+        self.assertEqual(self.refreshed, 0)
+        self.assertEqual(self.slept, [])
+
+    def test_holder_failed(self):
+        self.cache.add(self.lock_key, 'other', 30)
+
+        def holder_failed(seconds):
+            self.cache.delete(self.lock_key)
+        models.sleep = holder_failed
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.refreshed, 1)
+
+    def test_cache_down(self):
+        self.cache.add = lambda key, value, timeout=None: None
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.refreshed, 1)
+
+    def test_timeout(self):
+        self.cache.add(self.lock_key, 'other', 30)
+        self.assertRaises(GanetiApiError, self.get)
+        self.assertEqual(self.refreshed, 0)
+
+    def test_failed_refresh_releases_lock(self):
+        def refresh():
+            raise GanetiApiError('down')
+        self.assertRaises(
+            GanetiApiError,
+            self.cluster._get_or_refresh, 'info', refresh
+        )
+        self.assertFalse(self.lock_key in self.cache.data)
+
+    def test_foreign_lock_kept(self):
+        def refresh():
+            # The lock expired during the refresh and was taken again
+            self.cache.set(self.lock_key, 'other')
+            return 'new'
+        self.assertEqual(self.cluster._get_or_refresh('info', refresh), 'new')
+        self.assertEqual(self.cache.get(self.lock_key), 'other')
+
+
+class SnapshotVersionTest(ClusterCacheTestCase):
+    instances = [{'name': 'vm1', 'mtime': 1.5}, {'name': 'vm2', 'mtime': 2}]
+
+    def publish(self, instances):
+        self.now += 1
+        return self.cluster._publish_snapshot_version(instances, 10)
+
+    def test_unchanged(self):
+        version = self.publish(self.instances)
+        self.assertEqual(self.publish(list(self.instances)), version)
+        self.assertEqual(self.cluster.get_snapshot_version(), version)
+
+    def test_changed(self):
+        version = self.publish(self.instances)
+        changed = self.publish(self.instances[:1])
+        self.assertNotEqual(changed, version)
+        self.assertEqual(self.cluster.get_snapshot_version(), changed)
+        # Going back to the previous data is a new version as well
+        self.assertNotEqual(self.publish(self.instances), version)
+
+    def test_cleared(self):
+        version = self.publish(self.instances)
+        self.cache.delete(self.cluster._cache_key('version'))
+        self.assertNotEqual(self.publish(self.instances), version)
+
+
+class InstanceNameIndexTest(ClusterCacheTestCase):
+    def setUp(self):
+        super(InstanceNameIndexTest, self).setUp()
+        self.record = {'name': 'vm1.example.com', 'tags': []}
+        self.client.records['instance'] = [self.record]
+        self.cluster._index_instances([self.record], 10)
+
+    def test_indexed(self):
+        instance = models.Instance.objects._get_by_name('vm1.example.com')
+        self.assertEqual(instance.name, 'vm1.example.com')
+        self.assertEqual(instance.cluster.slug, 'cl1')
+        self.assertEqual(self.client.queries, [])
+
+    def test_not_indexed(self):
+        self.assertEqual(
+            models.Instance.objects._get_by_name('vm2.example.com'),
+            None
+        )
+
+    def test_stale_index(self):
+        # The instance is gone from the cluster and its record expired
+        self.client.records['instance'] = []
+        self.cache.delete(
+            self.cluster._instance_cache_key('vm1.example.com')
+        )
+        self.assertEqual(
+            models.Instance.objects._get_by_name('vm1.example.com'),
+            None
+        )
+        self.assertFalse(
+            models._instance_cluster_key('vm1.example.com') in self.cache.data
+        )
+
+
+def instance_record(name, owners=(), groups=(), vcpus=1, memory=512,
+                    disks=(10,)):
+    return {
+        'name': name,
+        'tags': (
+            ['%suser:%s' % (models._TAG_PREFIX, owner) for owner in owners] +
+            ['%sgroup:%s' % (models._TAG_PREFIX, group) for group in groups]
+        ),
+        'beparams': {'vcpus': vcpus, 'maxmem': memory},
+        'disk.sizes': list(disks),
+        'nic.links': [],
+        'nic.macs': [],
+    }
+
+
+class SnapshotIndexTest(ClusterCacheTestCase):
+    def setUp(self):
+        super(SnapshotIndexTest, self).setUp()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.carol = User.objects.create(username='carol')
+        self.team = Group.objects.create(name='team')
+        self.carol.groups.add(self.team)
+
+    def publish(self, instances):
+        self.cluster._publish_snapshot(instances, 10)
+
+    def visible(self, user):
+        return sorted(
+            instance.name
+            for instance in self.cluster._get_visible_instances(user)
+        )
+
+    def test_visibility(self):
+        self.publish([
+            instance_record('vm1', owners=['alice']),
+            instance_record('vm2', owners=['alice', 'bob']),
+            instance_record('vm3', groups=['team']),
+        ])
+        self.assertEqual(self.visible(self.alice), ['vm1', 'vm2'])
+        self.assertEqual(self.visible(self.bob), ['vm2'])
+        self.assertEqual(self.visible(self.carol), ['vm3'])
+        self.publish([instance_record('vm2', owners=['bob'])])
+        self.assertEqual(self.visible(self.alice), [])
+        self.assertEqual(self.visible(self.carol), [])
+        # An expired snapshot is not used
+        self.now += 20
+        self.assertEqual(self.cluster._get_visible_instances(self.bob), None)
+
+    def test_accounting(self):
+        self.publish([
+            instance_record('vm1', owners=['alice'], vcpus=2, disks=(10, 5)),
+            instance_record('vm2', owners=['alice', 'bob'], memory=1024),
+        ])
+        self.assertEqual(self.cluster.get_accounting(), {
+            'alice': {'instances': 2, 'cpu': 3, 'memory': 1536, 'disk': 25},
+            'bob': {'instances': 1, 'cpu': 1, 'memory': 1024, 'disk': 10},
+        })
+        # Only the changes are applied: vm1 is gone, vm2 changed owners and
+        # vm3 is new
+        self.publish([
+            instance_record('vm2', owners=['bob'], memory=2048),
+            instance_record('vm3', owners=['bob']),
+        ])
+        self.assertEqual(self.cluster.get_accounting(), {
+            'bob': {'instances': 2, 'cpu': 2, 'memory': 2560, 'disk': 20},
+        })
+
+
+class JobFeedTest(ClusterCacheTestCase):
+    def setUp(self):
+        super(JobFeedTest, self).setUp()
+        self.jobs = dict([
+            (job_id, {'id': job_id, 'status': status, 'ops': []})
+            for (job_id, status) in [
+                (1, 'success'),
+                (2, 'running'),
+                (3, 'queued'),
+                (4, 'error'),
+                (5, 'success'),
+                (6, 'success'),
+            ]
+        ])
+        self.update()
+
+    def update(self):
+        self.client.records['job'] = sorted(
+            self.jobs.values(),
+            key=lambda job: job['id']
+        )
+        self.now += 10
+
+    def feed(self, cursor=None):
+        jobs, cursor = self.cluster.get_job_feed(cursor)
+        return [(job['id'], job['status']) for job in jobs], cursor
+
+    def test_cursor(self):
+        jobs, cursor = self.feed()
+        self.assertEqual(jobs, [
+            (1, 'success'), (2, 'running'), (3, 'queued'), (4, 'error'),
+            (5, 'success'), (6, 'success'),
+        ])
+        self.assertEqual(self.feed(cursor), ([], cursor))
+        self.jobs[2]['status'] = 'success'
+        self.jobs[7] = {'id': 7, 'status': 'queued', 'ops': []}
+        self.update()
+        del self.client.queries[:]
+        jobs, next_cursor = self.feed(cursor)
+        self.assertEqual(jobs, [(2, 'success'), (7, 'queued')])
+        self.assertTrue(next_cursor > cursor)
+        # Only the new jobs and the ones not finalized were queried again
+        self.assertEqual(len(self.client.queries), 1)
+        what, qfilter = self.client.queries[0]
+        self.assertEqual(qfilter[0], '|')
+        self.assertEqual(
+            sorted(qfilter[1:]),
+            [['=', 'id', 2], ['=', 'id', 3], ['=', 'id', 7]]
+        )
+        self.assertEqual(self.feed(next_cursor), ([], next_cursor))
+
+    def test_archived(self):
+        self.feed()
+        del self.jobs[1]
+        self.update()
+        self.cluster.refresh_jobs()
+        self.assertFalse(self.cluster._job_key(1) in self.cache.data)
+        self.assertEqual(
+            [job for job, status in self.feed()[0]],
+            [2, 3, 4, 5, 6]
+        )
+
+    def test_expiry(self):
+        self.feed()
+        self.assertEqual(
+            self.cache.timeouts[self.cluster._job_key(1)],
+            models.FINALIZED_JOB_CACHE_TIMEOUT
+        )
+        self.assertEqual(
+            self.cache.timeouts[self.cluster._job_key(2)],
+            models.JOBS_CACHE_TIMEOUT + models.STALE_CACHE_TIMEOUT
+        )
+        self.cluster.get_job(1)
+        self.assertEqual(
+            self.cache.timeouts[self.cluster._cache_key('jobstatus:1')],
+            models.FINALIZED_JOB_CACHE_TIMEOUT
+        )
+
+    def test_expired_records(self):
+        self.feed()
+        for job_id in [1, 2, 4, 5]:
+            self.cache.delete(self.cluster._job_key(job_id))
+        del self.client.queries[:]
+        self.assertEqual(len(self.feed()[0]), 6)
+        # Most records were missing, so all the jobs were listed at once
+        self.assertEqual(self.client.queries, [('job', None)])
+
+    def test_unreachable_cluster_cursor(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        browser = Client()
+        browser.login(username='admin', password='secret')
+        url = reverse('jobs_json')
+        response = json.loads(browser.get(url).content)
+        cursor = response['cursors']
+        self.assertEqual(len(response['aaData']), 6)
+
+        def unreachable(self, cursor=None):
+            raise GanetiApiError('Cluster unreachable')
+        get_job_feed = Cluster.get_job_feed
+        Cluster.get_job_feed = unreachable
+        try:
+            response = json.loads(
+                browser.get(url, {'cursors': cursor}).content
+            )
+        finally:
+            Cluster.get_job_feed = get_job_feed
+        self.assertEqual(response['aaData'], [])
+        self.assertEqual(response['cursors'], cursor)
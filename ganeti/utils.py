@@ -1,27 +1,370 @@
+import re
+
 from gevent.pool import Pool
-from django.core.urlresolvers import reverse
-from django.db import close_connection
+from django.core.urlresolvers import reverse, NoReverseMatch
+from django.db import close_connection, transaction, DatabaseError
+from django.db.models import Q
+from django.utils.encoding import force_unicode, iri_to_uri
+from django.utils.importlib import import_module
 
 from ganeti.models import Instance, Cluster
 from util.client import GanetiApiError
 
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# The first importable module of the list, providing a json compatible
+# dumps(), encodes the JSON responses
+try:
+    from ganetimgr.settings import JSON_ENCODER
+except ImportError:
+    JSON_ENCODER = ['ujson', 'json']
+
+try:
+    from ganetimgr.settings import STREAM_JSON_RESPONSES
+except ImportError:
+    STREAM_JSON_RESPONSES = True
+
+# Number of rows encoded in every chunk of a streamed response
+STREAM_JSON_CHUNK_ROWS = 100
+
+# Regular expression searches made of such words separated by | select
+# among values, e.g. the clusters of a filter
+_PLAIN_WORD = re.compile(r'^[\w-]+$', re.U)
+
+
+def _get_json_encoder(modules):
+    if isinstance(modules, basestring):
+        modules = [modules]
+    for module in modules:
+        try:
+            return import_module(module).dumps
+        except (ImportError, AttributeError):
+            continue
+    return json.dumps
+
+json_dumps = _get_json_encoder(JSON_ENCODER)
+
+
+def stream_json(rows, extra=None):
+    '''Yields the JSON encoding of {"aaData": rows, ...} in chunks, while
+    consuming rows, so that the whole list is never held in memory. extra,
+    if given, is called after the last row and returns the rest of the keys
+    of the object'''
+    yield '{"aaData": ['
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(json_dumps(row))
+        if len(chunk) >= STREAM_JSON_CHUNK_ROWS:
+            yield ('' if first else ', ') + ', '.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ', ') + ', '.join(chunk)
+    yield ']'
+    if extra is not None:
+        for key, value in extra().iteritems():
+            yield ', %s: %s' % (json_dumps(key), json_dumps(value))
+    yield '}'
+
+
+def _to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def datatables_value(row, data):
+    '''Returns the value of row pointed to by a DataTables mData property,
+    e.g. "ops.0.OP_ID"'''
+    value = row
+    for part in data.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, (list, tuple)):
+            index = _to_int(part, None)
+            if index is None or not -len(value) <= index < len(value):
+                return None
+            value = value[index]
+        else:
+            return None
+    return value
+
+
+class DataTablesQuery(object):
+    '''The paging, sorting and filtering parameters DataTables sends when
+    server-side processing is enabled. Applied to the rows of a JSON
+    endpoint, it returns just the page that is going to be displayed'''
+
+    def __init__(self, params):
+        self.echo = _to_int(params.get('sEcho'), 0)
+        self.start = max(_to_int(params.get('iDisplayStart'), 0), 0)
+        # -1 stands for "All"
+        self.length = _to_int(params.get('iDisplayLength'), -1)
+        self.search = self._parse_search(
+            params.get('sSearch', ''),
+            params.get('bRegex') == 'true'
+        )
+        self.columns = []
+        for i in range(_to_int(params.get('iColumns'), 0)):
+            self.columns.append({
+                'data': params.get('mDataProp_%d' % i, str(i)),
+                'searchable': params.get('bSearchable_%d' % i) != 'false',
+                'search': self._parse_search(
+                    params.get('sSearch_%d' % i, ''),
+                    params.get('bRegex_%d' % i) == 'true'
+                ),
+            })
+        self.sorting = []
+        for i in range(_to_int(params.get('iSortingCols'), 0)):
+            column = _to_int(params.get('iSortCol_%d' % i), -1)
+            if 0 <= column < len(self.columns):
+                self.sorting.append((
+                    self.columns[column]['data'],
+                    params.get('sSortDir_%d' % i) == 'desc'
+                ))
+
+    @classmethod
+    def from_request(cls, request):
+        '''Returns the query of the request, or None if the request does
+        not come from a server-side processing DataTable'''
+        if 'sEcho' not in request.GET:
+            return None
+        return cls(request.GET)
+
+    def _parse_search(self, search, regex):
+        '''Returns a list of (term, compiled pattern, is regex) that must
+        all match. Plain searches match every one of their words, as
+        DataTables does, and so do invalid regular expressions'''
+        if not search:
+            return []
+        if regex:
+            try:
+                return [(search, re.compile(search, re.I | re.U), True)]
+            except re.error:
+                pass
+        return [
+            (word, re.compile(re.escape(word), re.I | re.U), False)
+            for word in search.split()
+        ]
+
+    def _matches(self, row):
+        for column in self.columns:
+            if column['search']:
+                value = unicode(datatables_value(row, column['data']))
+                for term, pattern, regex in column['search']:
+                    if not pattern.search(value):
+                        return False
+        if self.search:
+            values = [
+                unicode(datatables_value(row, column['data']))
+                for column in self.columns if column['searchable']
+            ]
+            for term, pattern, regex in self.search:
+                for value in values:
+                    if pattern.search(value):
+                        break
+                else:
+                    return False
+        return True
+
+    def filter(self, rows):
+        if not self.search and not [c for c in self.columns if c['search']]:
+            return rows
+        return [row for row in rows if self._matches(row)]
+
+    def sort(self, rows):
+        def _key(data):
+            def _get(row):
+                value = datatables_value(row, data)
+                if isinstance(value, basestring):
+                    return value.lower()
+                return value
+            return _get
+        rows = list(rows)
+        # Sort by the least significant column first, sorts are stable
+        for data, descending in reversed(self.sorting):
+            rows.sort(key=_key(data), reverse=descending)
+        return rows
+
+    def page(self, rows):
+        if self.length < 0:
+            return rows[self.start:]
+        return rows[self.start:self.start + self.length]
+
+    def _search_condition(self, field, term, regex):
+        if not regex:
+            return Q(**{'%s__icontains' % field: term})
+        words = term.split('|')
+        if all(_PLAIN_WORD.match(word) for word in words):
+            # A choice of values, e.g. from a select filter
+            condition = Q()
+            for word in words:
+                condition |= Q(**{'%s__iexact' % field: word})
+            return condition
+        return Q(**{'%s__iregex' % field: term})
+
+    def _filter_queryset(self, queryset, fields, regex):
+        for column in self.columns:
+            field = fields.get(column['data'])
+            if field is None:
+                continue
+            for term, pattern, is_regex in column['search']:
+                queryset = queryset.filter(
+                    self._search_condition(field, term, regex and is_regex)
+                )
+        searchable = [
+            fields[column['data']] for column in self.columns
+            if column['searchable'] and column['data'] in fields
+        ]
+        for term, pattern, is_regex in self.search:
+            condition = Q()
+            for field in searchable:
+                condition |= self._search_condition(
+                    field, term, regex and is_regex
+                )
+            queryset = queryset.filter(condition)
+        ordering = [
+            '%s%s' % ('-' if descending else '', fields[data])
+            for (data, descending) in self.sorting if data in fields
+        ]
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def filter_queryset(self, queryset, fields):
+        '''Applies the query to a queryset in the database. fields maps the
+        mData properties of the columns to the model fields. Returns the
+        total and the displayed number of objects and the objects of the
+        page. Regular expressions the database rejects are searched for as
+        plain text'''
+        total = queryset.count()
+        filtered = self._filter_queryset(queryset, fields, True)
+        sid = transaction.savepoint()
+        try:
+            displayed = filtered.count()
+            transaction.savepoint_commit(sid)
+        except DatabaseError:
+            transaction.savepoint_rollback(sid)
+            filtered = self._filter_queryset(queryset, fields, False)
+            displayed = filtered.count()
+        if self.length < 0:
+            return total, displayed, filtered[self.start:]
+        return total, displayed, filtered[self.start:self.start + self.length]
+
+    def response(self, rows, extra=None):
+        '''Returns the DataTables response for rows, which holds the page
+        of the filtered and sorted rows and the keys of extra'''
+        displayed = self.sort(self.filter(rows))
+        response = {
+            'sEcho': self.echo,
+            'iTotalRecords': len(rows),
+            'iTotalDisplayRecords': len(displayed),
+            'aaData': self.page(displayed),
+        }
+        if extra:
+            response.update(extra)
+        return response
+
+
+class UrlTemplate(object):
+    '''A named URL that is reversed once, with placeholder arguments, and is
+    then built by putting the actual arguments in place of the placeholders.
+    For valid arguments it returns what reverse() does, at the cost of a few
+    string operations, so it is meant for the row builders of long listings.
+    Unlike reverse(), the arguments are not matched against the pattern.
+
+    args is the number of positional arguments or the list of the names of
+    the keyword arguments. samples maps arguments (by position or name) to
+    a sample value, with %s in place of the placeholder, for arguments whose
+    pattern does not match a plain placeholder, e.g. {3: '/eth%s'}.
+    '''
+
+    def __init__(self, viewname, args=0, samples=None):
+        self.viewname = viewname
+        if isinstance(args, (int, long)):
+            self.names = range(args)
+            self.keywords = False
+        else:
+            self.names = list(args)
+            self.keywords = True
+        self.samples = samples or {}
+        # Static parts of the URL and (position, argument) of the slots,
+        # False if the URL could not be reversed with placeholders
+        self._parts = None
+        self._slots = None
+
+    def _compile(self):
+        values = {}
+        for n, name in enumerate(self.names):
+            values[name] = self.samples.get(name, '%s') % (9000001 + n)
+        try:
+            if self.keywords:
+                url = reverse(self.viewname, kwargs=values)
+            else:
+                url = reverse(
+                    self.viewname,
+                    args=[values[name] for name in self.names]
+                )
+        except NoReverseMatch:
+            self._parts = False
+            return
+        by_value = dict([(iri_to_uri(v), k) for (k, v) in values.items()])
+        parts = re.split(
+            '(%s)' % '|'.join([re.escape(v) for v in by_value.keys()]),
+            url
+        )
+        slots = [
+            (position, by_value[part])
+            for (position, part) in enumerate(parts) if position % 2
+        ]
+        if sorted([name for (position, name) in slots]) != \
+                sorted(self.names):
+            # A placeholder went missing or showed up twice
+            self._parts = False
+            return
+        self._slots = slots
+        self._parts = parts
+
+    def __call__(self, *args, **kwargs):
+        if self._parts is None:
+            self._compile()
+        if self._parts is False:
+            return reverse(
+                self.viewname,
+                args=args or None,
+                kwargs=kwargs or None
+            )
+        values = kwargs if self.keywords else args
+        url = list(self._parts)
+        for position, name in self._slots:
+            url[position] = iri_to_uri(force_unicode(values[name]))
+        return ''.join(url)
+
+
+INSTANCE_DETAIL_URL = UrlTemplate(
+    'instance-detail',
+    ['cluster_slug', 'instance']
+)
+USER_INFO_URL = UrlTemplate('user-info', ['type', 'usergroup'])
+GRAPH_URL = UrlTemplate('graph', 3)
+NIC_GRAPH_URL = UrlTemplate('graph', 4, {3: '/eth%s'})
+
 
 def get_instance_data(instance, cluster, node=None):
-    instance.cpu_url = reverse(
-        'graph',
-        args=(cluster.slug, instance.name, 'cpu-ts')
-    )
+    instance.cpu_url = GRAPH_URL(cluster.slug, instance.name, 'cpu-ts')
     instance.net_url = []
     for (nic_i, link) in enumerate(instance.nic_links):
         instance.net_url.append(
-            reverse(
-                'graph',
-                args=(
-                    cluster.slug,
-                    instance.name,
-                    'net-ts',
-                    '/eth%s' % nic_i
-                )
+            NIC_GRAPH_URL(
+                cluster.slug,
+                instance.name,
+                'net-ts',
+                '/eth%s' % nic_i
             )
         )
     return {
@@ -53,7 +53,16 @@ from operator import itemgetter
 from auditlog.models import *
 
 from ganeti.models import *
-from ganeti.utils import prepare_clusternodes, get_nodes_with_graphs
+from ganeti.utils import (
+    prepare_clusternodes,
+    get_nodes_with_graphs,
+    json_dumps,
+    stream_json,
+    DataTablesQuery,
+    INSTANCE_DETAIL_URL,
+    USER_INFO_URL,
+    STREAM_JSON_RESPONSES
+)
 from ganeti.forms import *
 
 
@@ -79,6 +88,11 @@ MESSAGE_TAGS = {
     50: 'danger',
 }
 
+# Lifetime of the cached instance rows of a snapshot version
+INSTANCE_ROWS_TIMEOUT = 90
+# Number of instance rows fetched from (and stored to) the cache at once
+INSTANCE_ROWS_BATCH = 500
+
 
 def cluster_overview(request):
     clusters = Cluster.objects.all()
@@ -256,36 +270,62 @@ def jobs_index_json(request):
         request.user.has_perm('ganeti.view_instances')
     ):
         cluster_slug = request.GET.get('cluster', None)
+        # Cursors of a previous response, as slug:cursor pairs, ask only for
+        # the jobs that are new or changed status since then
+        cursors = {}
+        for pair in request.GET.get('cursors', '').split(','):
+            slug, sep, cursor = pair.partition(':')
+            if sep and cursor.isdigit():
+                cursors[slug] = int(cursor)
         messages = ""
         p = Pool(20)
         jobs = []
         bad_clusters = []
+        new_cursors = {}
 
         def _get_jobs(cluster):
             try:
-                jobs.extend(cluster.get_job_list())
+                cjobs, cursor = cluster.get_job_feed(
+                    cursors.get(cluster.slug)
+                )
+                jobs.extend(cjobs)
+                new_cursors[cluster.slug] = cursor
             except (GanetiApiError, Exception):
                 bad_clusters.append(cluster)
+                # Its changes are asked for again once it is reachable
+                if cluster.slug in cursors:
+                    new_cursors[cluster.slug] = cursors[cluster.slug]
             finally:
                 close_connection()
         if not request.user.is_anonymous():
             clusters = Cluster.objects.all()
             if cluster_slug:
                 clusters = clusters.filter(slug=cluster_slug)
-            p.imap(_get_jobs, clusters)
-            p.join()
+            p.map(_get_jobs, clusters)
         if bad_clusters:
             messages = "Some jobs may be missing because the" \
                 " following clusters are unreachable: %s" \
                 % (", ".join([c.description for c in bad_clusters]))
         jresp = {}
         clusters = list(set([j['cluster'] for j in jobs]))
-        jresp['aaData'] = jobs
         if messages:
             jresp['messages'] = messages
         jresp['clusters'] = clusters
-        res = jresp
-        return HttpResponse(json.dumps(res), mimetype='application/json')
+        jresp['cursors'] = ",".join(
+            ["%s:%s" % item for item in sorted(new_cursors.items())]
+        )
+        datatables = DataTablesQuery.from_request(request)
+        if datatables is not None:
+            # The status counters are shown for all the jobs, not the page
+            statuses = {}
+            for job in jobs:
+                statuses[job['status']] = statuses.get(job['status'], 0) + 1
+            jresp['statuses'] = statuses
+            res = datatables.response(jobs, jresp)
+        else:
+            jresp['aaData'] = jobs
+            res = jresp
+        return HttpResponse(json_dumps(res), mimetype='application/json')
     else:
         return HttpResponse(
             json.dumps({'error': "Unauthorized access"}),
@@ -326,49 +366,49 @@ def job_details(request):
         return HttpResponseRedirect(reverse('user-instances'))
 
 
-def clusterdetails_generator(slug):
-    cluster_profile = {}
-    cluster_profile['slug'] = slug
-    cluster = Cluster.objects.get(slug=slug)
-    cluster_profile['description'] = cluster.description
-    cluster_profile['hostname'] = cluster.hostname
-    # We want to fetch info about the cluster per se, networks,
-    # nodes and nodegroups plus a really brief instances outline.
-    # Nodegroups
-    nodegroups = cluster.get_node_group_stack()
-    nodes = cluster.get_cluster_nodes()
-    # Networks
-    networks = cluster.get_networks()
-    # Instances later on...
-    cluster_profile['clusterinfo'] = cluster.get_cluster_info()
-    cluster_profile['clusterinfo']['mtime'] = str(cluster_profile['clusterinfo']['mtime'])
-    cluster_profile['clusterinfo']['ctime'] = str(cluster_profile['clusterinfo']['ctime'])
-    cluster_profile['nodegroups'] = nodegroups
-    cluster_profile['nodes'] = nodes
-    cluster_profile['networks'] = networks
-    return cluster_profile
-
-
 @login_required
 def clusterdetails_json(request):
     if request.user.is_superuser or request.user.has_perm('ganeti.view_instances'):
-        clusterlist = cache.get("cluster:allclusterdetails")
-        if clusterlist is None:
-            clusterlist = []
-            errors = []
-            p = Pool(10)
+        clusters = Cluster.objects.all()
+        # Most profiles are fresh, those are read in a single round trip
+        profiles = Cluster.get_fresh(clusters, 'profile')
+        stale = []
+        unreachable = []
+        p = Pool(10)
 
-            def _get_cluster_details(cluster):
-                try:
-                    clusterlist.append(clusterdetails_generator(cluster.slug))
-                except (GanetiApiError, Exception):
-                    errors.append(Exception)
-                finally:
-                    close_connection()
-            p.imap(_get_cluster_details, Cluster.objects.all())
-            p.join()
-            cache.set("clusters:allclusterdetails", clusterlist, 180)
-        return HttpResponse(json.dumps(clusterlist), mimetype='application/json')
+        def _get_profile(cluster):
+            try:
+                profiles[cluster.slug] = cluster.get_profile()
+                if cluster.is_stale('profile'):
+                    stale.append(cluster.slug)
+            except (GanetiApiError, Exception):
+                unreachable.append(cluster.slug)
+            finally:
+                close_connection()
+        p.imap(
+            _get_profile,
+            [c for c in clusters if c.slug not in profiles]
+        )
+        p.join()
+        res = {
+            'clusters': [profiles[slug] for slug in sorted(profiles)],
+            'stale': sorted(stale),
+            'unreachable': sorted(unreachable)
+        }
+        messages = []
+        if unreachable:
+            messages.append(
+                "The following clusters are unreachable: %s"
+                % ", ".join(res['unreachable'])
+            )
+        if stale:
+            messages.append(
+                "The details of the following clusters may be outdated: %s"
+                % ", ".join(res['stale'])
+            )
+        if messages:
+            res['messages'] = "<br>".join(messages)
+        return HttpResponse(json.dumps(res), mimetype='application/json')
     else:
         return HttpResponse(
             json.dumps({'error': "Unauthorized access"}),
@@ -389,7 +429,6 @@ def clusterdetails(request):
 
 @login_required
 def user_index_json(request):
-    messages = ""
     cluster_slug = request.GET.get('cluster', None)
     if request.user.is_anonymous():
         action = {
@@ -401,6 +440,7 @@ def user_index_json(request):
         return HttpResponse(json.dumps(action), mimetype='application/json')
     p = Pool(20)
     instances = []
+    versions = {}
     bad_clusters = []
     bad_instances = []
     locked_clusters = []
@@ -410,55 +450,22 @@ def user_index_json(request):
         if locked:
             locked_clusters.append(str(cluster))
         try:
+            # Read before the instances, which are at least as recent
+            versions[cluster.slug] = cluster.get_snapshot_version()
             instances.extend(cluster.get_user_instances(request.user))
         except (GanetiApiError, Exception):
             bad_clusters.append(cluster)
         finally:
             close_connection()
-    jresp = {}
-    cache_key = "user:%s:index:instances" % request.user.username
-    if cluster_slug:
-        cache_key = "user:%s:%s:instances" % (
-            request.user.username,
-            cluster_slug
-        )
-    res = cache.get(cache_key)
-    instancedetails = []
-    j = Pool(80)
-    user = request.user
+    datatables = DataTablesQuery.from_request(request)
     locked_instances = cache.get('locked_instances')
 
-    def _get_instance_details(instance):
-        try:
-            if (
-                locked_instances is not None and
-                instance.name in locked_instances
-            ):
-                instance.joblock = locked_instances['%s' % instance.name]
-            else:
-                instance.joblock = False
-            instancedetails.extend(generate_json(instance, user))
-        except (GanetiApiError, Exception):
-            bad_instances.append(instance)
-        finally:
-            close_connection()
-
-    if res is None:
-        if not request.user.is_anonymous():
-            clusters = Cluster.objects.all()
-            if cluster_slug:
-                clusters = clusters.filter(slug=cluster_slug)
-            p.imap(_get_instances, clusters)
-            p.join()
-        cache_timeout = 90
+    def _get_messages():
+        messages = ""
         if bad_clusters:
             messages = "Some instances may be missing because the" \
                 " following clusters are unreachable: %s" \
                 % (", ".join([c.description for c in bad_clusters]))
-            cache_timeout = 30
-        j.imap(_get_instance_details, instances)
-        j.join()
-
         if locked_clusters:
             messages += 'Some clusters are under maintenance: <br>'
             messages += ', '.join(locked_clusters)
@@ -471,15 +478,44 @@ def user_index_json(request):
                 messages = messages + "<br>" + bad_inst_text
             else:
                 messages = bad_inst_text
-            cache_timeout = 30
+        return messages
 
-        jresp['aaData'] = instancedetails
-        if messages:
-            jresp['messages'] = messages
-        cache.set(cache_key, jresp, cache_timeout)
-        res = jresp
+    clusters = Cluster.objects.all()
+    if cluster_slug:
+        clusters = clusters.filter(slug=cluster_slug)
+    p.imap(_get_instances, clusters)
+    p.join()
+    rows = generate_json_rows(
+        instances,
+        request.user,
+        versions,
+        locked_instances,
+        bad_instances
+    )
+
+    # A page is a slice of the sorted rows, these can not be streamed
+    if STREAM_JSON_RESPONSES and datatables is None:
+        def _extra():
+            messages = _get_messages()
+            if messages:
+                return {'messages': messages}
+            return {}
+        return HttpResponse(
+            stream_json(rows, _extra),
+            mimetype='application/json'
+        )
 
-    return HttpResponse(json.dumps(res), mimetype='application/json')
+    rows = list(rows)
+    jresp = {}
+    messages = _get_messages()
+    if messages:
+        jresp['messages'] = messages
+    if datatables is not None:
+        res = datatables.response(rows, jresp)
+    else:
+        jresp['aaData'] = rows
+        res = jresp
+    return HttpResponse(json_dumps(res), mimetype='application/json')
 
 
 @login_required
@@ -493,125 +529,97 @@ def user_sum_stats(request):
         }
         return HttpResponse(json.dumps(action), mimetype='application/json')
     p = Pool(20)
-    instances = []
+    user_dict = {}
     bad_clusters = []
+    admin = request.user.is_superuser or \
+        request.user.has_perm('ganeti.view_instances')
 
-    def _get_instances(cluster):
+    def _add(username, totals):
+        if not username in user_dict:
+            user_dict[username] = {
+                'instances': 0,
+                'disk': 0,
+                'cpu': 0,
+                'memory': 0
+            }
+        for key in ['instances', 'disk', 'cpu', 'memory']:
+            user_dict[username][key] += totals[key]
+
+    def _get_accounting(cluster):
         try:
-            instances.extend(cluster.get_user_instances(request.user))
+            if admin:
+                for username, totals in cluster.get_accounting().items():
+                    _add(username, totals)
+            else:
+                # Everything the user sees is accounted to the user
+                for i in cluster.get_user_instances(request.user):
+                    _add(request.user.username, {
+                        'instances': 1,
+                        'disk': sum(i.disk_sizes),
+                        'cpu': int(i.beparams['vcpus']),
+                        'memory': int(i.beparams['maxmem'])
+                    })
         except (GanetiApiError, Exception):
             bad_clusters.append(cluster)
         finally:
             close_connection()
-    if not request.user.is_anonymous():
-        p.imap(_get_instances, Cluster.objects.all())
-        p.join()
+    p.imap(_get_accounting, Cluster.objects.all())
+    p.join()
 
     if bad_clusters:
         messages.add_message(request, messages.WARNING,
                              "Some instances may be missing because the"
                              " following clusters are unreachable: " +
                              ", ".join([c.description for c in bad_clusters]))
-    jresp = {}
-    cache_key = "user:%s:index:instance:light" % request.user.username
-    res = cache.get(cache_key)
-    instancedetails = []
-    j = Pool(80)
-    user = request.user
-
-    def _get_instance_details(instance):
-        try:
-            instancedetails.extend(generate_json_light(instance, user))
-        except (GanetiApiError, Exception):
-            pass
-        finally:
-            close_connection()
-    if res is None:
-        j.imap(_get_instance_details, instances)
-        j.join()
-        jresp['aaData'] = instancedetails
-        cache.set(cache_key, jresp, 125)
-        res = jresp
-
-    instances_stats = []
-    user_dict = {}
-    cache_key_stats = "user:%s:index:users:instance:stats" % \
-        request.user.username
-    instances_stats = cache.get(cache_key_stats)
-    if instances_stats is None:
-        for i in res['aaData']:
-            if not 'users' in i:
-                i['users'] = [{'user': request.user.username}]
-            for useritem in i['users']:
-                if not useritem['user'] in user_dict:
-                    user_dict[useritem['user']] = {
-                        'instances': 0,
-                        'disk': 0,
-                        'cpu': 0,
-                        'memory': 0
-                    }
-                user_dict[useritem['user']]['instances'] = user_dict[
-                    useritem['user']
-                ]['instances'] + 1
-                user_dict[useritem['user']]['disk'] = user_dict[
-                    useritem['user']
-                ]['disk'] + int(i['disk'])
-                user_dict[useritem['user']]['cpu'] = user_dict[
-                    useritem['user']
-                ]['cpu'] + int(i['vcpus'])
-                user_dict[useritem['user']]['memory'] = user_dict[
-                    useritem['user']
-                ]['memory'] + int(i['memory'])
-        #TODO: Must implement that in a more efficient way
-        instances_stats_list = []
-        for u in user_dict.keys():
-            user_stats_dict = {}
-            user_stats_dict['user_href'] = "%s"%(reverse("user-info",
-                        kwargs={'type': 'user', 'usergroup':u}
-                        ))
-            user_stats_dict['user'] = u
-            user_stats_dict['instances'] = user_dict[u]['instances']
-            user_stats_dict['disk'] = user_dict[u]['disk']
-            user_stats_dict['cpu'] = user_dict[u]['cpu']
-            user_stats_dict['memory'] = user_dict[u]['memory']
-            instances_stats_list.append(user_stats_dict)
-        return_dict = {'aaData': instances_stats_list}
-        cache.set(cache_key_stats, return_dict, 120)
-        instances_stats = return_dict
+    if admin:
+        # Only the owners that are (still) users are shown
+        usernames = set(
+            User.objects.filter(
+                username__in=user_dict.keys()
+            ).values_list('username', flat=True)
+        )
+    else:
+        usernames = user_dict.keys()
+    instances_stats_list = []
+    for u in usernames:
+        user_stats_dict = {}
+        user_stats_dict['user_href'] = "%s" % (
+            USER_INFO_URL(type='user', usergroup=u)
+        )
+        user_stats_dict['user'] = u
+        user_stats_dict['instances'] = user_dict[u]['instances']
+        user_stats_dict['disk'] = user_dict[u]['disk']
+        user_stats_dict['cpu'] = user_dict[u]['cpu']
+        user_stats_dict['memory'] = user_dict[u]['memory']
+        instances_stats_list.append(user_stats_dict)
     return HttpResponse(
-        json.dumps(instances_stats),
+        json_dumps({'aaData': instances_stats_list}),
         mimetype='application/json'
     )
 
 
-def generate_json(instance, user):
-    jresp_list = []
+def _generate_json_row(instance, admin):
+    '''Renders the JSON row of an instance, as seen by admins or by the
+    users of the instance. It does not depend on the requesting user, nor on
+    the job locks, so it is shared by all the users of each variant'''
     i = instance
     inst_dict = {}
     if not i.admin_view_only:
         inst_dict['name_href'] = "%s" % (
-            reverse(
-                'instance-detail',
-                kwargs={
-                    'cluster_slug': i.cluster.slug, 'instance': i.name
-                }
-            )
+            INSTANCE_DETAIL_URL(cluster_slug=i.cluster.slug, instance=i.name)
         )
     inst_dict['name'] = i.name
-    if user.is_superuser or user.has_perm('ganeti.view_instances'):
+    if admin:
         inst_dict['cluster'] = i.cluster.slug
         inst_dict['pnode'] = i.pnode
     else:
         inst_dict['cluster'] = i.cluster.description
         inst_dict['clusterslug'] = i.cluster.slug
-    inst_dict['node_group_locked'] = i.cluster.check_node_group_lock_by_node(
-        i.pnode
-    )
     inst_dict['memory'] = memsize(i.beparams['maxmem'])
     inst_dict['disk'] = ", ".join(disksizes(i.disk_sizes))
     inst_dict['vcpus'] = i.beparams['vcpus']
     inst_dict['ipaddress'] = [ip for ip in i.nic_ips if ip]
-    if not user.is_superuser and not user.has_perm('ganeti.view_instances'):
+    if not admin:
         inst_dict['ipv6address'] = [ip for ip in i.ipv6s if ip]
     #inst_dict['status'] = i.nic_ips[0] if i.nic_ips[0] else "-"
     if i.admin_state == i.oper_state:
@@ -652,19 +660,11 @@ def generate_json(instance, user):
             except KeyError:
                 pass
 
-    if i.joblock:
-        inst_dict['locked'] = True
-        inst_dict['locked_reason'] = "%s" % ((i.joblock).capitalize())
-        if inst_dict['locked_reason'] in ['Deleting', 'Renaming']:
-            try:
-                del inst_dict['name_href']
-            except KeyError:
-                pass
     if 'cdrom_image_path' in i.hvparams.keys():
         if i.hvparams['cdrom_image_path'] and i.hvparams['boot_order'] == 'cdrom':
             inst_dict['cdrom'] = True
     inst_dict['nic_macs'] = ', '.join(i.nic_macs)
-    if user.is_superuser or user.has_perm('ganeti.view_instances'):
+    if admin:
         inst_dict['nic_links'] = ', '.join(i.nic_links)
         inst_dict['network'] = []
         for (nic_i, link) in enumerate(i.nic_links):
@@ -679,13 +679,7 @@ def generate_json(instance, user):
                 'user': user_item.username,
                 'email': user_item.email,
                 'user_href': "%s" % (
-                    reverse(
-                        "user-info",
-                        kwargs={
-                            'type': 'user',
-                            'usergroup': user_item.username
-                        }
-                    )
+                    USER_INFO_URL(type='user', usergroup=user_item.username)
                 )
             } for user_item in i.users]
         inst_dict['groups'] = [
@@ -694,19 +688,87 @@ def generate_json(instance, user):
                 'groupusers': [
                     "%s,%s" % (u.username, u.email) for u in group.userset
                 ],
-                'group_href':"%s" % (
-                    reverse(
-                        "user-info",
-                        kwargs={
-                            'type': 'group',
-                            'usergroup': group.name
-                        }
-                    )
+                'group_href': "%s" % (
+                    USER_INFO_URL(type='group', usergroup=group.name)
                 )
             } for group in i.groups
         ]
-    jresp_list.append(inst_dict)
-    return jresp_list
+    return inst_dict
+
+
+def _overlay_json_row(row, instance, joblock):
+    '''Returns a copy of a shared instance row with the state that changes
+    independently of the instance snapshot'''
+    inst_dict = dict(row)
+    inst_dict['node_group_locked'] = \
+        instance.cluster.check_node_group_lock_by_node(instance.pnode)
+    if joblock:
+        inst_dict['locked'] = True
+        inst_dict['locked_reason'] = "%s" % (joblock.capitalize())
+        if inst_dict['locked_reason'] in ['Deleting', 'Renaming']:
+            try:
+                del inst_dict['name_href']
+            except KeyError:
+                pass
+    return inst_dict
+
+
+def generate_json(instance, user):
+    admin = user.is_superuser or user.has_perm('ganeti.view_instances')
+    return [
+        _overlay_json_row(
+            _generate_json_row(instance, admin),
+            instance,
+            instance.joblock
+        )
+    ]
+
+
+def generate_json_rows(instances, user, versions, locked_instances=None,
+                       bad_instances=None):
+    '''Yields the JSON rows of instances for user. The rows are cached per
+    instance and snapshot version (versions maps cluster slugs to the version
+    the instances are at least as recent as) and shared by all the admins or
+    all the users, so a user only picks the rows of the instances they see.
+    Instances that can not be rendered are appended to bad_instances'''
+    admin = user.is_superuser or user.has_perm('ganeti.view_instances')
+    variant = 'admin' if admin else 'user'
+    locked_instances = locked_instances or {}
+    for start in range(0, len(instances), INSTANCE_ROWS_BATCH):
+        batch = instances[start:start + INSTANCE_ROWS_BATCH]
+        keys = []
+        for i in batch:
+            version = versions.get(i.cluster.slug)
+            if version is None:
+                keys.append(None)
+            else:
+                keys.append(
+                    "cluster:%s:row:%s:%s:%s" % (
+                        i.cluster.slug,
+                        version,
+                        variant,
+                        i.name
+                    )
+                )
+        cached = cache.get_many([key for key in keys if key is not None])
+        rendered = {}
+        for i, key in zip(batch, keys):
+            try:
+                row = cached.get(key) if key is not None else None
+                if row is None:
+                    row = _generate_json_row(i, admin)
+                    if key is not None:
+                        rendered[key] = row
+                yield _overlay_json_row(
+                    row,
+                    i,
+                    locked_instances.get(i.name, False)
+                )
+            except (GanetiApiError, Exception):
+                if bad_instances is not None:
+                    bad_instances.append(i)
+        if rendered:
+            cache.set_many(rendered, INSTANCE_ROWS_TIMEOUT)
 
 
 def generate_json_light(instance, user):
@@ -716,13 +778,7 @@ def generate_json_light(instance, user):
     inst_dict = {}
     if not i.admin_view_only:
         inst_dict['name_href'] = "%s" % (
-            reverse(
-                "instance-detail",
-                kwargs={
-                    'cluster_slug': i.cluster.slug,
-                    'instance': i.name
-                }
-            )
+            INSTANCE_DETAIL_URL(cluster_slug=i.cluster.slug, instance=i.name)
         )
     inst_dict['name'] = i.name
     inst_dict['clusterslug'] = i.cluster.slug
@@ -1808,9 +1864,13 @@ def clusternodes_json(request, cluster=None):
                 else:
                     node_dict['cluster'] = node['cluster']
                 nodedetails.append(node_dict)
-        jresp['aaData'] = nodedetails
-        res = jresp
-        return HttpResponse(json.dumps(res), mimetype='application/json')
+        datatables = DataTablesQuery.from_request(request)
+        if datatables is not None:
+            res = datatables.response(nodedetails)
+        else:
+            jresp['aaData'] = nodedetails
+            res = jresp
+        return HttpResponse(json_dumps(res), mimetype='application/json')
     else:
         return HttpResponse(
             json.dumps({'error': 'Unauthorized access'}),
@@ -1844,38 +1904,34 @@ def stats(request):
     clusters = Cluster.objects.all()
     exclude_pks = []
     if (request.user.is_superuser or request.user.has_perm('ganeti.view_instances')):
-        instances = cache.get('leninstances')
-        if instances is None:
-            p = Pool(20)
-            instances = []
+        p = Pool(20)
+        counters = []
 
-            def _get_instances(cluster):
-                try:
-                    instances.extend(cluster.get_user_instances(request.user))
-                except (GanetiApiError, Exception):
-                    exclude_pks.append(cluster.pk)
-                finally:
-                    close_connection()
-            if not request.user.is_anonymous():
-                p.imap(_get_instances, clusters)
-                p.join()
-            instances = len(instances)
-            cache.set('leninstances', instances, 90)
+        def _get_stats(cluster):
+            try:
+                counters.append(cluster.get_stats()['instances'])
+            except (GanetiApiError, Exception):
+                exclude_pks.append(cluster.pk)
+            finally:
+                close_connection()
+        p.imap(_get_stats, clusters)
+        p.join()
+        instances = sum(counters)
         users = cache.get('lenusers')
         if users is None:
-            users = len(User.objects.all())
+            users = User.objects.count()
             cache.set('lenusers', users, 90)
         groups = cache.get('lengroups')
         if groups is None:
-            groups = len(Group.objects.all())
+            groups = Group.objects.count()
             cache.set('lengroups', groups, 90)
         instance_apps = cache.get('leninstapps')
         if instance_apps is None:
-            instance_apps = len(InstanceApplication.objects.all())
+            instance_apps = InstanceApplication.objects.count()
             cache.set('leninstapps', instance_apps, 90)
         orgs = cache.get('lenorgs')
         if orgs is None:
-            orgs = len(Organization.objects.all())
+            orgs = Organization.objects.count()
             cache.set('lenorgs', orgs, 90)
         if exclude_pks:
             clusters = clusters.exclude(pk__in=exclude_pks)
@@ -1901,6 +1957,25 @@ def stats(request):
 
 @login_required
 def stats_ajax_instances(request):
+    if (
+        request.user.is_superuser or
+        request.user.has_perm('ganeti.view_instances')
+    ):
+        # Admins see the creation timelines kept with the snapshots
+        def _get_timeline(cluster):
+            try:
+                timeline = cluster.get_stats()['timeline']
+            except (GanetiApiError, Timeout):
+                timeline = []
+            finally:
+                close_connection()
+            return {'name': cluster.slug, 'instances': timeline}
+        p = Pool(20)
+        cluster_list = p.map(_get_timeline, Cluster.objects.all())
+        return HttpResponse(
+            json_dumps(cluster_list),
+            mimetype='application/json'
+        )
     username = request.user.username
     cluster_list = cache.get('%s:ajaxinstances' % username)
     if cluster_list is None:
@@ -1911,13 +1986,7 @@ def stats_ajax_instances(request):
             cinstances = []
             i = 0
             cluster_dict = {}
-            if (
-                request.user.is_superuser or
-                request.user.has_perm('ganeti.view_instances')
-            ):
-                cluster_dict['name'] = cluster.slug
-            else:
-                cluster_dict['name'] = cluster.description
+            cluster_dict['name'] = cluster.description
             cluster_dict['instances'] = []
             try:
                 cinstances.extend(cluster.get_user_instances(request.user))
@@ -1943,6 +2012,23 @@ def stats_ajax_instances(request):
 
 @login_required
 def stats_ajax_vms_per_cluster(request, cluster_slug):
+    if (
+        request.user.is_superuser or
+        request.user.has_perm('ganeti.view_instances')
+    ):
+        cluster = Cluster.objects.get(slug=cluster_slug)
+        try:
+            stats = cluster.get_stats()
+        except (GanetiApiError, Timeout):
+            return HttpResponse(json.dumps([]), mimetype='application/json')
+        cluster_dict = {
+            'name': cluster.slug,
+            'instances': {'up': stats['up'], 'down': stats['down']}
+        }
+        return HttpResponse(
+            json.dumps(cluster_dict),
+            mimetype='application/json'
+        )
     cluster_dict = cache.get('%s:ajaxvmscluster:%s' % (
         request.user.username,
         cluster_slug)
@@ -2096,14 +2182,12 @@ def idle_accounts(request):
 
 
 def clear_cluster_user_cache(username, cluster_slug):
-    cache.delete("user:%s:index:instances" % username)
     cache.delete("cluster:%s:instances" % cluster_slug)
+    cache.delete("cluster:%s:version" % cluster_slug)
 
 
 def refresh_cluster_cache(cluster, instance):
     cluster.force_cluster_cache_refresh(instance)
-    for u in User.objects.all():
-        cache.delete("user:%s:index:instances" % u.username)
     nodes, bc, bn = prepare_clusternodes()
     cache.set('allclusternodes', nodes, 90)
     cache.set('badclusters', bc, 90)
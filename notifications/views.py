@@ -153,7 +153,10 @@ def get_user_group_list(request):
 
         def _get_instances(cluster):
             try:
-                instances.extend(cluster.get_user_instances(request.user))
+                # Only the names are shown
+                instances.extend(
+                    [i['name'] for i in cluster.query('instance', ['name'])]
+                )
             except (GanetiApiError, Exception):
                 bad_clusters.append(cluster)
             finally:
@@ -164,7 +167,10 @@ def get_user_group_list(request):
         if q_params:
             users = users.filter(username__icontains=q_params)
             groups = groups.filter(name__icontains=q_params)
-            instances = Instance.objects.filter(name__icontains=q_params)
+            instances = [
+                i.name for i in
+                Instance.objects.filter(name__icontains=q_params)
+            ]
             clusters = clusters.filter(slug__icontains=q_params)
         ret_list = []
         for user in users:
@@ -182,8 +188,8 @@ def get_user_group_list(request):
             ret_list.append(groupd)
         for instance in instances:
             instd = {}
-            instd['text'] = instance.name
-            instd['id'] = "i_%s" % instance.name
+            instd['text'] = instance
+            instd['id'] = "i_%s" % instance
             instd['type'] = "vm"
             ret_list.append(instd)
         for cluster in clusters:
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*- vim:fileencoding=utf-8:
+# Copyright (C) 2010-2014 GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+
+from gevent import monkey
+monkey.patch_all()
+
+import atexit
+import daemon
+import logging
+import daemon.pidlockfile
+import setproctitle
+from lockfile import LockError
+from signal import SIGINT, SIGTERM
+from time import time
+
+from gevent import sleep, signal, spawn
+from gevent import reinit as gevent_reinit
+
+import ganetimgr.settings as settings
+
+from django.core.management import setup_environ
+setup_environ(settings)
+
+from ganeti.models import Cluster
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_connection
+
+logger = None
+
+DEFAULT_INTERVAL = 30
+DEFAULT_PID_FILE = "/var/run/ganetimgr-poller.pid"
+DEFAULT_LOG_FILE = "/var/log/ganetimgr/poller.log"
+# The refreshed keys outlive a few poll intervals, so that a slow or failed
+# run does not leave the web workers with an empty cache
+CACHE_TIMEOUT_FACTOR = 3
+
+
+def poll_cluster(slug, interval):
+    global logger
+    logger.info("Polling cluster %s every %ds" % (slug, interval))
+    while True:
+        try:
+            cluster = Cluster.objects.get(slug=slug)
+        except ObjectDoesNotExist:
+            logger.info("Cluster %s vanished, forgetting it" % slug)
+            return
+        finally:
+            close_connection()
+
+        start = time()
+        logger.debug("Refreshing cluster %s" % slug)
+        try:
+            version = cluster.refresh_cache(
+                timeout=interval * CACHE_TIMEOUT_FACTOR
+            )
+            logger.debug("Cluster %s refreshed in %.2fs (version: %s)" %
+                         (slug, time() - start, version))
+        except Exception, err:
+            logger.warn("Error refreshing cluster %s: %s" % (slug, str(err)))
+        finally:
+            close_connection()
+        sleep(max(interval - (time() - start), 0))
+
+
+def poll_clusters(interval):
+    global logger
+    pollers = {}
+    while True:
+        try:
+            slugs = [c.slug for c in Cluster.objects.all()]
+        except Exception, err:
+            logger.error("Error listing clusters: %s" % str(err))
+            slugs = []
+        finally:
+            close_connection()
+        for slug in slugs:
+            if slug not in pollers or pollers[slug].ready():
+                pollers[slug] = spawn(poll_cluster, slug, interval)
+        sleep(interval)
+
+
+def parse_arguments(args):
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-i", "--interval", dest="interval", type="int",
+                      default=DEFAULT_INTERVAL, metavar="SECONDS",
+                      help="Refresh every cluster's cache every SECONDS"
+                           " (default: %d)" % DEFAULT_INTERVAL)
+    parser.add_option("-d", "--debug", action="store_true", dest="debug")
+    parser.add_option("-p", "--pid-file", dest="pid_file",
+                      default=DEFAULT_PID_FILE, metavar="FILE",
+                      help="Save PID to file (default: %s)" % DEFAULT_PID_FILE)
+    parser.add_option("-l", "--log-file", dest="log_file",
+                      default=DEFAULT_LOG_FILE, metavar="FILE",
+                      help="Write log to FILE (default: %s)" %
+                           DEFAULT_LOG_FILE)
+    parser.add_option("-f", "--foreground", action="store_true",
+                      dest="foreground", help="Do not daemonize")
+    parser.add_option("-u", "--user", dest="user", metavar="USER",
+                      help="User to run as")
+    parser.add_option("-g", "--group", dest="group", metavar="GROUP",
+                      help="Group to run as")
+    return parser.parse_args(args)
+
+
+class AllFilesDaemonContext(daemon.DaemonContext):
+    """ DaemonContext class keeping all file descriptors open """
+    def _get_exclude_file_descriptors(self):
+        class All:
+            def __contains__(self, value):
+                return True
+        return All()
+
+
+def fatal_signal_handler(signame):
+    logger.info("Caught %s, exiting" % signame)
+    raise SystemExit
+
+
+def main():
+    opts, args = parse_arguments(sys.argv[1:])
+    pidf = daemon.pidlockfile.TimeoutPIDLockFile(opts.pid_file, 3)
+
+    lvl = logging.DEBUG if opts.debug else logging.INFO
+
+    global logger
+    logger = logging.getLogger("poller")
+    logger.setLevel(lvl)
+    formatter = logging.Formatter("%(asctime)s %(message)s",
+                                  "%m/%d/%Y %I:%M:%S %p")
+    handler = logging.FileHandler(opts.log_file)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    # The per key refresh errors of the clusters
+    models_logger = logging.getLogger("ganeti.models")
+    models_logger.setLevel(lvl)
+    models_logger.addHandler(handler)
+
+    logger.info("Starting up")
+
+    context = None
+    if not opts.foreground:
+        # See watcher.py on why all file descriptors are kept open
+        context = AllFilesDaemonContext(pidfile=pidf, umask=0022)
+        if opts.user:
+            try:
+                context.uid = int(opts.user)
+            except ValueError:
+                import pwd
+                try:
+                    context.uid = pwd.getpwnam(opts.user).pw_uid
+                except KeyError:
+                    sys.stderr.write("User %s not found\n" % opts.user)
+                    sys.exit(1)
+
+        if opts.group:
+            try:
+                context.gid = int(opts.group)
+            except ValueError:
+                import grp
+                try:
+                    context.gid = grp.getgrnam(opts.group).gr_gid
+                except KeyError:
+                    sys.stderr.write("Group %s not found\n" % opts.group)
+                    sys.exit(1)
+
+        try:
+            context.open()
+        except LockError:
+            sys.stderr.write("Unable to acquire PID file lock."
+                             " Is another process running?\n")
+            sys.exit(1)
+
+        logger.info("Forked to background")
+        # We must reinit gevent after forking
+        gevent_reinit()
+
+    else:
+        try:
+            pidf.__enter__()
+        except LockError:
+            sys.stderr.write("Unable to acquire PID file lock."
+                             " Is another process running?\n")
+            sys.exit(1)
+        atexit.register(pidf.__exit__)
+
+    signal(SIGINT, fatal_signal_handler, "SIGINT")
+    signal(SIGTERM, fatal_signal_handler, "SIGTERM")
+
+    # Set the process title
+    setproctitle.setproctitle(sys.argv[0])
+
+    logger.info("Initialization complete")
+    poll_clusters(opts.interval)
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,14 @@ from django.utils.encoding import smart_unicode, smart_str
 
 
 class CacheClass(BaseCache):
+    # Compares and deletes in a single step, so that no other value set in
+    # between is deleted
+    _DELETE_IF_EQUAL = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
 
     def __init__(self, server, params):
         "Connect to Redis, and set up cache backend."
@@ -81,11 +89,25 @@ class CacheClass(BaseCache):
 
     def add(self, key, value, timeout=0):
         """Add a value to the cache, failing if the key already exists.
-        Returns ``True`` if the object was added, ``False`` if not.
+        Returns ``True`` if the object was added, ``False`` if not and
+        ``None`` if the cache could not be reached.
         """
-        if self._cache.exists(key):
-            return False
-        return self.set(key, value, timeout)
+        key = self._prepare_key(key)
+
+        try:
+            # A single SET NX EX keeps add() atomic, so that it can be used
+            # as a lock that cannot be left behind without an expiration
+            if timeout == -1:
+                return self._cache.setnx(key, self._pack_value(value))
+            return bool(self._cache.set(
+                key,
+                self._pack_value(value),
+                ex=timeout or self.default_timeout,
+                nx=True
+            ))
+        except redis.RedisError, e:
+            logging.warning("Unable to add key to cache: %s", str(e))
+            return None
 
     def set(self, key, value, timeout=None):
         "Persist a value to the cache, and set an optional expiration time."
@@ -122,6 +144,39 @@ class CacheClass(BaseCache):
         else:
             return self._unpack_value(value)
 
+    def set_many(self, data, timeout=None, version=None):
+        "Persist several key/value pairs in a single round trip."
+        try:
+            pipe = self._cache.pipeline(transaction=False)
+            for key, value in data.iteritems():
+                key = self._prepare_key(key)
+                pipe.set(key, self._pack_value(value))
+                if timeout != -1:
+                    pipe.expire(key, timeout or self.default_timeout)
+            pipe.execute()
+        except redis.RedisError, e:
+            logging.warning("Unable to write keys to cache: %s", str(e))
+
+    def get_many(self, keys, version=None):
+        """Retrieve several values from the cache in a single round trip.
+        Returns a dict of the keys that were found.
+        """
+        if not keys:
+            return {}
+        try:
+            values = self._cache.mget(
+                [self._prepare_key(key) for key in keys]
+            )
+        except redis.RedisError, e:
+            logging.warning("Unable to connect to cache: %s", str(e))
+            return {}
+
+        ret = {}
+        for key, value in zip(keys, values):
+            if value is not None:
+                ret[key] = self._unpack_value(value)
+        return ret
+
     def delete(self, key):
         "Remove a key from the cache."
         key = self._prepare_key(key)
@@ -129,6 +184,30 @@ class CacheClass(BaseCache):
             self._cache.delete(key)
         except redis.RedisError, e:
             logging.warning("Unable to delete key: %s", str(e))
+
+    def delete_if_equal(self, key, value):
+        """Remove a key from the cache, only if it still holds value, e.g.
+        to release a lock taken with add(). Returns whether it was removed.
+        """
+        try:
+            return bool(self._cache.eval(
+                self._DELETE_IF_EQUAL,
+                1,
+                self._prepare_key(key),
+                self._pack_value(value)
+            ))
+        except redis.RedisError, e:
+            logging.warning("Unable to delete key: %s", str(e))
+            return False
+
+    def delete_many(self, keys, version=None):
+        "Remove several keys from the cache in a single round trip."
+        if not keys:
+            return
+        try:
+            self._cache.delete(*[self._prepare_key(key) for key in keys])
+        except redis.RedisError, e:
+            logging.warning("Unable to delete keys: %s", str(e))
     
     def keys(self, pattern="*"):
         "Fetch all keys from the cache."
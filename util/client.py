@@ -46,6 +46,15 @@ try:
 except ImportError:
   from StringIO import StringIO
 
+# Under gevent, waiting for the sockets of the transfers yields to the other
+# greenlets, so that their requests run concurrently
+try:
+  from gevent.select import select as _select
+  from gevent import sleep as _sleep
+except ImportError:
+  from select import select as _select
+  from time import sleep as _sleep
+
 
 GANETI_RAPI_PORT = 5080
 GANETI_RAPI_VERSION = 2
@@ -171,6 +180,17 @@ _CURL_SSL_CERT_ERRORS = frozenset([
   _CURLE_SSL_CACERT_BADFILE,
   ])
 
+#: Idle cURL handles kept per RAPI host, see L{_CurlPool}
+CURL_POOL_SIZE = 8
+
+#: Seconds after which an idle cURL handle is no longer reused, as the server
+#: has most probably closed its end of the connection by then
+CURL_POOL_MAX_IDLE = 60
+
+#: Longest wait, in seconds, for the sockets of the running transfers before
+#: libcurl is called again (see curl_multi_fdset(3))
+_CURL_MULTI_WAIT = 0.1
+
 
 class Error(Exception):
   """Base error class for this module.
@@ -249,6 +269,400 @@ def UsesRapiClient(fn):
   return wrapper
 
 
+class _CurlPool(object):
+  """Pool of idle cURL handles to a single RAPI host.
+
+  A handle keeps its connection open after a request, so taking it from the
+  pool saves the next request to the same host a new TCP connection and TLS
+  handshake.
+
+  """
+  def __init__(self, size, max_idle=CURL_POOL_MAX_IDLE, _time_fn=time.time):
+    """Initializes this class.
+
+    @type size: int
+    @param size: Maximum number of idle handles kept
+    @type max_idle: number
+    @param max_idle: Seconds after which an idle handle is closed
+
+    """
+    self._size = size
+    self._max_idle = max_idle
+    self._time_fn = _time_fn
+    self._idle = []
+    self._lock = threading.Lock()
+
+  def _Expire(self, now):
+    """Removes the idle handles that are too old or too many.
+
+    Must be called with the lock held.
+
+    @rtype: list
+    @return: The removed handles, which are to be closed
+
+    """
+    expired = []
+    while self._idle and (len(self._idle) > self._size or
+                          now - self._idle[0][1] > self._max_idle):
+      expired.append(self._idle.pop(0)[0])
+    return expired
+
+  def Get(self):
+    """Takes the most recently used idle handle from the pool.
+
+    @rtype: pycurl.Curl or None
+    @return: A handle, or None if no idle handle is available
+
+    """
+    now = self._time_fn()
+    curl = None
+    self._lock.acquire()
+    try:
+      expired = self._Expire(now)
+      if self._idle:
+        (curl, _) = self._idle.pop()
+    finally:
+      self._lock.release()
+
+    for handle in expired:
+      handle.close()
+
+    return curl
+
+  def Put(self, curl):
+    """Returns a handle to the pool, once its request is done.
+
+    @type curl: pycurl.Curl
+    @param curl: cURL object
+
+    """
+    now = self._time_fn()
+    self._lock.acquire()
+    try:
+      self._idle.append((curl, now))
+      expired = self._Expire(now)
+    finally:
+      self._lock.release()
+
+    for handle in expired:
+      handle.close()
+
+
+class _CurlConnection(object):
+  """A cURL handle along with the multi handle driving its transfers.
+
+  libcurl keeps the connections of a handle in the cache of the multi handle
+  it is added to, so every handle keeps its own multi handle for as long as
+  it lives, in order to reuse its connection.
+
+  """
+  def __init__(self, curl, multi=True):
+    """Initializes this class.
+
+    @type curl: pycurl.Curl
+    @param curl: cURL object
+    @type multi: bool
+    @param multi: Whether to drive the transfers through a multi handle, or
+                  just call C{perform} on the handle
+
+    """
+    self.curl = curl
+    if multi:
+      self.multi = pycurl.CurlMulti()
+    else:
+      self.multi = None
+
+  def close(self):
+    """Closes the handles and their connections.
+
+    """
+    self.curl.close()
+    if self.multi is not None:
+      self.multi.close()
+
+
+def _StepConnections(pending, errors):
+  """Runs the transfers of several connections for a while.
+
+  libcurl is called for every transfer, and then the sockets of all of them
+  are waited on at once, so that the transfers run concurrently.
+
+  @type pending: list of L{_CurlConnection}
+  @param pending: Connections whose transfer is running; the ones that
+                  finish are removed from it
+  @type errors: dict
+  @param errors: Where the C{pycurl.error} of every failed transfer is stored
+
+  """
+  rlist = []
+  wlist = []
+  xlist = []
+  timeout = _CURL_MULTI_WAIT
+
+  for conn in pending[:]:
+    while True:
+      (ret, active) = conn.multi.perform()
+      if ret != pycurl.E_CALL_MULTI_PERFORM:
+        break
+
+    if active:
+      (rfds, wfds, xfds) = conn.multi.fdset()
+      rlist.extend(rfds)
+      wlist.extend(wfds)
+      xlist.extend(xfds)
+      # Milliseconds until libcurl wants to be called, -1 if unknown
+      wait = conn.multi.timeout()
+      if wait >= 0:
+        timeout = min(timeout, wait / 1000.0)
+      continue
+
+    pending.remove(conn)
+    (_, _, failed) = conn.multi.info_read()
+    if failed:
+      (_, errno, errmsg) = failed[0]
+      errors[conn] = pycurl.error(errno, errmsg)
+
+  if not pending:
+    return
+
+  if rlist or wlist or xlist:
+    _select(rlist, wlist, xlist, timeout)
+  else:
+    _sleep(timeout)
+
+
+def _PerformConnections(connections):
+  """Runs the transfers of several connections concurrently.
+
+  All the transfers are driven by a single loop, which waits on the sockets
+  of all of them at once.
+
+  @type connections: list of L{_CurlConnection}
+  @param connections: Connections, whose handles are configured for their
+                      request
+  @rtype: dict
+  @return: The C{pycurl.error} of every connection whose transfer failed
+
+  """
+  errors = {}
+  pending = []
+
+  for conn in connections:
+    if conn.multi is None:
+      try:
+        conn.curl.perform()
+      except pycurl.error, err:
+        errors[conn] = err
+    else:
+      conn.multi.add_handle(conn.curl)
+      pending.append(conn)
+
+  try:
+    while pending:
+      _StepConnections(pending, errors)
+  finally:
+    for conn in connections:
+      if conn.multi is not None:
+        conn.multi.remove_handle(conn.curl)
+
+  return errors
+
+
+class _JsonStreamDecoder(object):
+  """Incremental decoder of a JSON response holding a large array.
+
+  The response is fed in chunks, as they arrive, and the items of the array
+  are decoded as soon as they are complete, so that neither the whole body
+  nor the whole decoded array is ever held in memory. The array is either
+  the response itself, or the value of a key of the response object.
+
+  """
+  _WHITESPACE = " \t\n\r"
+  _NUMBER = "0123456789+-.eE"
+
+  def __init__(self, key=None):
+    """Initializes this class.
+
+    @type key: string or None
+    @param key: Key of the response object whose value is streamed, None
+                if the response is the array itself
+
+    """
+    self._key = key
+    self._decoder = simplejson.JSONDecoder()
+    self._buf = ""
+    self._pos = 0
+    self._state = "start"
+    self._current = None
+    self._items = []
+    self._finished = False
+    self._error = None
+    #: The other keys of the response object
+    self.other = {}
+
+  def Feed(self, data):
+    """Decodes a chunk of the response.
+
+    Can be used as the C{WRITEFUNCTION} of a cURL object. Decoding errors
+    are raised by L{Finish}, so that the transfer itself is not aborted.
+
+    """
+    if self._error is not None:
+      return
+    if self._pos:
+      self._buf = self._buf[self._pos:] + data
+      self._pos = 0
+    else:
+      self._buf += data
+    try:
+      self._Decode()
+    except ValueError, err:
+      self._error = err
+
+  def Pop(self):
+    """Returns the items decoded since the last call.
+
+    @rtype: list
+
+    """
+    (items, self._items) = (self._items, [])
+    return items
+
+  def Finish(self):
+    """Decodes the end of the response.
+
+    @rtype: dict
+    @return: The other keys of the response object
+    @raise ValueError: If the response is not valid JSON
+
+    """
+    if self._error is not None:
+      raise self._error
+    self._finished = True
+    self._Decode()
+    if self._state != "done" or self._buf[self._pos:].strip():
+      raise ValueError("Invalid or truncated JSON response")
+    return self.other
+
+  def _SkipWhitespace(self):
+    buf = self._buf
+    pos = self._pos
+    while pos < len(buf) and buf[pos] in self._WHITESPACE:
+      pos += 1
+    self._pos = pos
+    return pos < len(buf)
+
+  def _DecodeValue(self):
+    """Decodes the next value.
+
+    @rtype: tuple
+    @return: Whether the value was complete, and the value
+
+    """
+    try:
+      (value, end) = self._decoder.raw_decode(self._buf, self._pos)
+    except ValueError:
+      if self._finished:
+        raise
+      return (False, None)
+    # A number could go on in the next chunk, even after a cut at its
+    # fraction or exponent ("2." or "1e" is decoded as a shorter number)
+    if (not self._finished and self._buf[self._pos] not in "[{\"" and
+        not self._buf[end:].lstrip(self._NUMBER)):
+      return (False, None)
+    self._pos = end
+    return (True, value)
+
+  def _Decode(self):
+    while self._SkipWhitespace():
+      char = self._buf[self._pos]
+
+      if self._state == "start":
+        if char == "[" and self._key is None:
+          self._pos += 1
+          self._state = "items"
+        elif char == "{":
+          self._pos += 1
+          self._state = "key"
+        else:
+          raise ValueError("Unexpected JSON response")
+
+      elif self._state == "key":
+        if char == ",":
+          self._pos += 1
+        elif char == "}":
+          self._pos += 1
+          self._state = "done"
+        else:
+          start = self._pos
+          (complete, key) = self._DecodeValue()
+          if not complete:
+            return
+          if not self._SkipWhitespace():
+            # Decode the key again along with its colon
+            self._pos = start
+            return
+          if self._buf[self._pos] != ":":
+            raise ValueError("Unexpected JSON response")
+          self._pos += 1
+          self._current = key
+          self._state = "value"
+
+      elif self._state == "value":
+        if char == "[" and self._current == self._key:
+          self._pos += 1
+          self._state = "items"
+        else:
+          (complete, value) = self._DecodeValue()
+          if not complete:
+            return
+          self.other[self._current] = value
+          self._state = "key"
+
+      elif self._state == "items":
+        if char == ",":
+          self._pos += 1
+        elif char == "]":
+          self._pos += 1
+          if self._key is None:
+            self._state = "done"
+          else:
+            self._state = "key"
+        else:
+          (complete, item) = self._DecodeValue()
+          if not complete:
+            return
+          self._items.append(item)
+
+      else:
+        # Trailing data, reported by Finish
+        return
+
+
+_curl_pools = {}
+_curl_pools_lock = threading.Lock()
+
+
+def _GetCurlPool(key, size):
+  """Returns the shared cURL handle pool of a RAPI host.
+
+  @type key: string
+  @param key: Base URL of the host
+  @type size: int
+  @param size: Size of the pool, if it has to be created
+
+  """
+  _curl_pools_lock.acquire()
+  try:
+    pool = _curl_pools.get(key)
+    if pool is None:
+      pool = _curl_pools[key] = _CurlPool(size)
+  finally:
+    _curl_pools_lock.release()
+
+  return pool
+
+
 def GenericCurlConfig(verbose=False, use_signal=False,
                       use_curl_cabundle=False, cafile=None, capath=None,
                       proxy=None, verify_hostname=False,
@@ -360,7 +774,8 @@ class GanetiRapiClient(object): # pylint: disable=R0904
 
   def __init__(self, host, port=GANETI_RAPI_PORT,
                username=None, password=None, logger=logging,
-               curl_config_fn=None, curl_factory=None):
+               curl_config_fn=None, curl_factory=None,
+               curl_pool_size=CURL_POOL_SIZE, compression=False):
     """Initializes this class.
 
     @type host: string
@@ -374,6 +789,13 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     @type curl_config_fn: callable
     @param curl_config_fn: Function to configure C{pycurl.Curl} object
     @param logger: Logging object
+    @type curl_pool_size: int
+    @param curl_pool_size: Idle cURL handles kept for reuse across the clients
+                           of the same host, 0 to use a new handle for every
+                           request. Handles of a C{curl_factory} are not pooled
+    @type compression: bool
+    @param compression: Whether to ask for compressed responses, which cURL
+                        decodes transparently
 
     """
     self._username = username
@@ -381,6 +803,7 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     self._logger = logger
     self._curl_config_fn = curl_config_fn
     self._curl_factory = curl_factory
+    self._compression = compression
 
     try:
       socket.inet_pton(socket.AF_INET6, host)
@@ -390,6 +813,11 @@ class GanetiRapiClient(object): # pylint: disable=R0904
 
     self._base_url = "https://%s" % address
 
+    if curl_factory is None and curl_pool_size:
+      self._curl_pool = _GetCurlPool(self._base_url, curl_pool_size)
+    else:
+      self._curl_pool = None
+
     if username is not None:
       if password is None:
         raise Error("Password not specified")
@@ -406,6 +834,48 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     else:
       curl = pycurl.Curl()
 
+    return self._ConfigureCurl(curl)
+
+  def _AcquireCurl(self):
+    """Returns a connection with a configured cURL object, reusing a pooled
+    one if possible.
+
+    @rtype: L{_CurlConnection}
+
+    """
+    if self._curl_pool is not None:
+      conn = self._curl_pool.Get()
+      if conn is not None:
+        # Resetting the options keeps the open connections of the handle
+        conn.curl.reset()
+        self._ConfigureCurl(conn.curl)
+        return conn
+
+    # Handles of a factory are not necessarily real ones
+    return _CurlConnection(self._CreateCurl(),
+                           multi=self._curl_factory is None)
+
+  def _ReleaseCurl(self, conn, reuse=True):
+    """Gives back a connection after its request is done.
+
+    @type conn: L{_CurlConnection}
+    @param conn: Connection returned by L{_AcquireCurl}
+    @type reuse: bool
+    @param reuse: Whether the handle and its connection can be reused
+
+    """
+    if self._curl_pool is None:
+      return
+
+    if reuse:
+      self._curl_pool.Put(conn)
+    else:
+      conn.close()
+
+  def _ConfigureCurl(self, curl):
+    """Applies the settings of this client to a cURL object.
+
+    """
     # Default cURL settings
     curl.setopt(pycurl.VERBOSE, False)
     curl.setopt(pycurl.FOLLOWLOCATION, False)
@@ -419,6 +889,14 @@ class GanetiRapiClient(object): # pylint: disable=R0904
       "Content-type: %s" % HTTP_APP_JSON,
       ])
 
+    if self._compression:
+      # An empty string asks for all the encodings cURL supports
+      curl.setopt(pycurl.ENCODING, "")
+
+    # Detect connections dropped while the handle is idle
+    if hasattr(pycurl, "TCP_KEEPALIVE"):
+      curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+
     assert ((self._username is None and self._password is None) ^
             (self._username is not None and self._password is not None))
 
@@ -462,11 +940,11 @@ class GanetiRapiClient(object): # pylint: disable=R0904
 
     return result
 
-  def _SendRequest(self, method, path, query, content):
-    """Sends an HTTP request.
+  def _PrepareRequest(self, method, path, query, content):
+    """Prepares an HTTP request to be performed.
 
-    This constructs a full URL, encodes and decodes HTTP bodies, and
-    handles invalid responses in a pythonic way.
+    This constructs a full URL, encodes the HTTP body and configures a cURL
+    object for the request.
 
     @type method: string
     @param method: HTTP method to use
@@ -477,16 +955,14 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     @type content: str or None
     @param content: HTTP body content
 
-    @rtype: str
-    @return: JSON-Decoded response
-
-    @raises CertificateError: If an invalid SSL certificate is found
-    @raises GanetiApiError: If an invalid response is returned
+    @rtype: tuple
+    @return: The L{_CurlConnection} to perform and the buffer of the response
 
     """
     assert path.startswith("/")
 
-    curl = self._CreateCurl()
+    conn = self._AcquireCurl()
+    curl = conn.curl
 
     if content is not None:
       encoded_content = self._json_encoder.encode(content)
@@ -513,24 +989,27 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     curl.setopt(pycurl.POSTFIELDS, str(encoded_content))
     curl.setopt(pycurl.WRITEFUNCTION, encoded_resp_body.write)
 
-    try:
-      # Send request and wait for response
-      try:
-        curl.perform()
-      except pycurl.error, err:
-        if err.args[0] in _CURL_SSL_CERT_ERRORS:
-          raise CertificateError("SSL certificate error %s" % err,
-                                 code=err.args[0])
+    return (conn, encoded_resp_body)
 
-        raise GanetiApiError(str(err), code=err.args[0])
-    finally:
-      # Reset settings to not keep references to large objects in memory
-      # between requests
-      curl.setopt(pycurl.POSTFIELDS, "")
-      curl.setopt(pycurl.WRITEFUNCTION, lambda _: None)
+  def _ProcessResponse(self, conn, encoded_resp_body, err):
+    """Handles the response of a performed request.
 
-    # Get HTTP response code
-    http_code = curl.getinfo(pycurl.RESPONSE_CODE)
+    Decodes the HTTP body and handles invalid responses in a pythonic way.
+
+    @type conn: L{_CurlConnection}
+    @param conn: Connection returned by L{_PrepareRequest}
+    @param encoded_resp_body: Buffer returned by L{_PrepareRequest}
+    @type err: pycurl.error or None
+    @param err: Error of the transfer, if it failed
+
+    @rtype: str
+    @return: JSON-Decoded response
+
+    @raises CertificateError: If an invalid SSL certificate is found
+    @raises GanetiApiError: If an invalid response is returned
+
+    """
+    http_code = self._FinishTransfer(conn, err)
 
     # Was anything written to the response buffer?
     if encoded_resp_body.tell():
@@ -538,6 +1017,55 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     else:
       response_content = None
 
+    self._CheckResponse(http_code, response_content)
+
+    return response_content
+
+  def _FinishTransfer(self, conn, err):
+    """Releases the connection of a performed request.
+
+    @type conn: L{_CurlConnection}
+    @param conn: Connection returned by L{_PrepareRequest}
+    @type err: pycurl.error or None
+    @param err: Error of the transfer, if it failed
+    @rtype: int
+    @return: HTTP response code
+
+    @raises CertificateError: If an invalid SSL certificate is found
+    @raises GanetiApiError: If the transfer failed
+
+    """
+    curl = conn.curl
+
+    # Reset settings to not keep references to large objects in memory
+    # between requests
+    curl.setopt(pycurl.POSTFIELDS, "")
+    curl.setopt(pycurl.WRITEFUNCTION, lambda _: None)
+
+    if err is not None:
+      # The connection of the handle is in an unknown state
+      self._ReleaseCurl(conn, reuse=False)
+
+      if err.args[0] in _CURL_SSL_CERT_ERRORS:
+        raise CertificateError("SSL certificate error %s" % err,
+                               code=err.args[0])
+
+      raise GanetiApiError(str(err), code=err.args[0])
+
+    # Get HTTP response code
+    http_code = curl.getinfo(pycurl.RESPONSE_CODE)
+
+    self._ReleaseCurl(conn)
+
+    return http_code
+
+  @staticmethod
+  def _CheckResponse(http_code, response_content):
+    """Raises the error reported by an invalid response.
+
+    @raises GanetiApiError: If the response is an error
+
+    """
     if http_code != HTTP_OK:
       if isinstance(response_content, dict):
         msg = ("%s %s: %s" %
@@ -549,7 +1077,93 @@ class GanetiRapiClient(object): # pylint: disable=R0904
 
       raise GanetiApiError(msg, code=http_code)
 
-    return response_content
+  def _SendRequest(self, method, path, query, content):
+    """Sends an HTTP request.
+
+    @type method: string
+    @param method: HTTP method to use
+    @type path: string
+    @param path: HTTP URL path
+    @type query: list of two-tuples
+    @param query: query arguments to pass to urllib.urlencode
+    @type content: str or None
+    @param content: HTTP body content
+
+    @rtype: str
+    @return: JSON-Decoded response
+
+    @raises CertificateError: If an invalid SSL certificate is found
+    @raises GanetiApiError: If an invalid response is returned
+
+    """
+    (conn, encoded_resp_body) = self._PrepareRequest(method, path, query,
+                                                     content)
+    try:
+      errors = _PerformConnections([conn])
+    except:
+      # Interrupted, e.g. by a timeout of the caller
+      self._ReleaseCurl(conn, reuse=False)
+      raise
+
+    return self._ProcessResponse(conn, encoded_resp_body, errors.get(conn))
+
+  def _SendStreamingRequest(self, method, path, query, content, key=None):
+    """Sends an HTTP request whose response holds a large array.
+
+    The items of the array are decoded and yielded while the response is
+    still arriving, see L{_JsonStreamDecoder}.
+
+    @type key: string or None
+    @param key: Key of the response object holding the array, None if the
+                response is the array itself
+    @return: Generator of the decoded items
+
+    @raises CertificateError: If an invalid SSL certificate is found
+    @raises GanetiApiError: If an invalid response is returned
+
+    """
+    (conn, _) = self._PrepareRequest(method, path, query, content)
+    decoder = _JsonStreamDecoder(key)
+    conn.curl.setopt(pycurl.WRITEFUNCTION, decoder.Feed)
+
+    errors = {}
+    done = False
+    try:
+      if conn.multi is None:
+        try:
+          conn.curl.perform()
+        except pycurl.error, err:
+          errors[conn] = err
+      else:
+        pending = [conn]
+        conn.multi.add_handle(conn.curl)
+        try:
+          while pending:
+            _StepConnections(pending, errors)
+            # Items of an error response are not items of the array
+            if conn.curl.getinfo(pycurl.RESPONSE_CODE) == HTTP_OK:
+              for item in decoder.Pop():
+                yield item
+        finally:
+          conn.multi.remove_handle(conn.curl)
+      done = True
+    finally:
+      if not done:
+        # Interrupted, or the generator was not exhausted
+        self._ReleaseCurl(conn, reuse=False)
+
+    http_code = self._FinishTransfer(conn, errors.get(conn))
+
+    if http_code != HTTP_OK:
+      try:
+        response_content = decoder.Finish()
+      except ValueError:
+        response_content = None
+      self._CheckResponse(http_code, response_content)
+
+    decoder.Finish()
+    for item in decoder.Pop():
+      yield item
 
   def GetVersion(self):
     """Gets the Remote API version running on the cluster.
@@ -688,6 +1302,19 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     else:
       return [i["id"] for i in instances]
 
+  def GetInstancesIter(self):
+    """Gets all information about the instances on the cluster, as it arrives.
+
+    Like L{GetInstances} with bulk set, but the response is decoded while it
+    is received, so that the whole of it is never held in memory.
+
+    @return: Generator of the info about every instance
+
+    """
+    return self._SendStreamingRequest(HTTP_GET,
+                                      "/%s/instances" % GANETI_RAPI_VERSION,
+                                      [("bulk", 1)], None)
+
   def GetInstance(self, instance):
     """Gets information about an instance.
 
@@ -2169,6 +2796,39 @@ class GanetiRapiClient(object): # pylint: disable=R0904
                              ("/%s/query/%s" %
                               (GANETI_RAPI_VERSION, what)), None, body)
 
+  def QueryIter(self, what, fields, qfilter=None):
+    """Retrieves information about resources, as it arrives.
+
+    Unlike L{Query}, the response is decoded while it is received, so that
+    the whole of it is never held in memory.
+
+    @type what: string
+    @param what: Resource name, one of L{constants.QR_VIA_RAPI}
+    @type fields: list of string
+    @param fields: Requested fields
+    @type qfilter: None or list
+    @param qfilter: Query filter
+
+    @return: Generator of a dict of the requested fields to their values,
+             for every resource
+
+    """
+    body = {
+      "fields": fields,
+      }
+
+    _SetItemIf(body, qfilter is not None, "qfilter", qfilter)
+    # TODO: remove "filter" after 2.7
+    _SetItemIf(body, qfilter is not None, "filter", qfilter)
+
+    # The data of every resource holds the (status, value) of the fields, in
+    # the requested order
+    for row in self._SendStreamingRequest(HTTP_PUT,
+                                          ("/%s/query/%s" %
+                                           (GANETI_RAPI_VERSION, what)),
+                                          None, body, key="data"):
+      yield dict((name, result[1]) for (name, result) in zip(fields, row))
+
   def QueryFields(self, what, fields=None):
     """Retrieves available fields for a resource.
 
@@ -41,10 +41,10 @@ from django.core.management import setup_environ
 setup_environ(settings)
 
 from ganeti.models import Cluster
+from util.client import GanetiApiError, JOB_STATUS_FINALIZED
 from apply.models import InstanceApplication, STATUS_FAILED, STATUS_SUCCESS
 from django.core.cache import cache
 from django.contrib.sites.models import Site
-from django.contrib.auth.models import User
 from django.utils.encoding import smart_str
 from django.core.mail import mail_admins, mail_managers, send_mail
 from django.core import urlresolvers
@@ -59,6 +59,11 @@ DEFAULT_WORKERS = 10
 DEFAULT_PID_FILE = "/var/run/ganetimgr-watcher.pid"
 DEFAULT_LOG_FILE = "/var/log/ganetimgr/watcher.log"
 RESERVE_ERROR_THRESHOLD = 30
+# RAPI error codes meaning that the cluster can not long-poll jobs
+LONG_POLL_UNSUPPORTED = [404, 405, 501]
+
+# Clusters whose jobs are polled, as long-polling is not supported
+polled_clusters = set()
 
 def next_poll_interval():
     for t in POLL_INTERVALS:
@@ -68,6 +73,37 @@ def next_poll_interval():
         yield POLL_INTERVALS[-1]
 
 
+def wait_for_job(cluster, job_id, status, poll_interval):
+    """Returns the status of a job once it is other than status, or after
+    the cluster gives up waiting. The job is long-polled, unless that
+    fails, in which case it is polled after the next poll_interval
+    """
+    global logger
+    unsupported = False
+    if cluster.slug not in polled_clusters:
+        try:
+            return cluster.wait_for_job_change(job_id, status) or status
+        except GanetiApiError, err:
+            unsupported = err.code in LONG_POLL_UNSUPPORTED
+            if not unsupported:
+                logger.warn("Error long-polling job %d: %s" %
+                            (job_id, str(err)))
+        finally:
+            close_connection()
+    if not unsupported:
+        sleep(poll_interval.next())
+    try:
+        status = cluster.get_job_status(job_id)["status"]
+    finally:
+        close_connection()
+    if unsupported:
+        # The job exists, so it is long-polling that the cluster lacks
+        logger.info("Cluster %s can not long-poll jobs, polling" %
+                    cluster.slug)
+        polled_clusters.add(cluster.slug)
+    return status
+
+
 def try_log(fn, *args, **kwargs):
     global logger
     try:
@@ -116,9 +152,8 @@ def monitor_jobs():
             DISPATCH_TABLE[data["type"]](job)
 
 def clear_cluster_users_cache(cluster_slug):
-    for user in User.objects.all():
-        cache.delete("user:%s:index:instances" %user.username)
     cache.delete("cluster:%s:instances" % cluster_slug)
+    cache.delete("cluster:%s:version" % cluster_slug)
     close_connection()
 
 def handle_job_lock(job):
@@ -141,6 +176,7 @@ def handle_job_lock(job):
         close_connection()
 
     pi = next_poll_interval()
+    status = None
     while True:
         logger.debug("Checking lock key %s (job: %d)" % (lock_key, job_id))
         reason = cache.get(lock_key)
@@ -149,19 +185,16 @@ def handle_job_lock(job):
             job.delete()
             return
 
-        logger.debug("Polling job %d" % job_id)
+        logger.debug("Waiting for job %d" % job_id)
         try:
-            status = cluster.get_job_status(job_id)
+            status = wait_for_job(cluster, job_id, status, pi)
         except Exception, err:
             logger.warn("Error polling job: %s" % str(err))
-            close_connection()
             sleep(pi.next())
             continue
-        finally:
-            close_connection()
         logger.debug("Done")
 
-        if status["end_ts"]:
+        if status in JOB_STATUS_FINALIZED:
             logger.info("Job %d finished, removing lock %s" %
                          (job_id, lock_key))
             if "flush_keys" in data:
@@ -189,7 +222,6 @@ def handle_job_lock(job):
         # Touch the key
         cache.set(lock_key, reason, 30)
         job.touch()
-        sleep(pi.next())
 
 
 def handle_creation(job):
@@ -212,12 +244,20 @@ def handle_creation(job):
 
     logger.info("Handling %s (job: %d)",
                  application.hostname, application.job_id)
+    pi = next_poll_interval()
+    job_status = None
     while True:
-        sleep(15)
         logger.info("Checking %s (job: %d)",
                      application.hostname, application.job_id)
-        status = application.cluster.get_job_status(application.job_id)
-        if status["end_ts"]:
+        try:
+            job_status = wait_for_job(application.cluster, application.job_id,
+                                      job_status, pi)
+        except Exception, err:
+            logger.warn("Error polling job: %s" % str(err))
+            sleep(pi.next())
+            continue
+        if job_status in JOB_STATUS_FINALIZED:
+            status = application.cluster.get_job_status(application.job_id)
             logger.info("%s (job: %d) done. Status: %s", application.hostname,
                          application.job_id, status["status"])
             if status["status"] == "error":